@@ -0,0 +1,51 @@
+import sys
+import time
+
+from mininet.log import setLogLevel
+from mininet.net import Mininet
+from mininet.link import TCLink
+
+from qdisc import BACKENDS
+
+# Per-update apply latency of each qdisc backend on a two-host link shaped the
+# same way the LinkEngine shapes r2-eth1 / r4-eth0 (tbf root + netem child).
+# Usage: sudo python3 bench_qdisc.py [n_updates]
+
+def bench(host, dev, backend, n_updates):
+    latencies = []
+    for i in range(n_updates):
+        bw = 50 + (i % 100)
+        delay = 20 + (i % 40)
+
+        start = time.perf_counter()
+        backend.apply([f'qdisc change dev {dev} parent 1:1 handle 10: netem delay {delay}ms'])
+        backend.apply([f'qdisc change dev {dev} root handle 1: tbf rate {bw}mbit burst 200k latency 50ms'])
+        latencies.append((time.perf_counter() - start) / 2)
+
+    return sorted(latencies)
+
+def report(name, latencies):
+    def pct(p): return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1e3
+    mean = sum(latencies) / len(latencies) * 1e3
+    print(f"{name:>6}: n={len(latencies)} mean={mean:.3f}ms p50={pct(0.5):.3f}ms p99={pct(0.99):.3f}ms max={latencies[-1] * 1e3:.3f}ms")
+
+if __name__ == '__main__':
+    n_updates = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    setLogLevel('warning')
+    net = Mininet(link=TCLink)
+    h1 = net.addHost('h1')
+    h2 = net.addHost('h2')
+    net.addLink(h1, h2)
+    net.build()
+
+    dev = 'h1-eth0'
+    h1.cmd(f'tc qdisc replace dev {dev} root handle 1: tbf rate 100mbit burst 200k latency 50ms')
+    h1.cmd(f'tc qdisc add dev {dev} parent 1:1 handle 10: netem delay 20ms')
+
+    for name, cls in BACKENDS.items():
+        backend = cls(h1)
+        report(name, bench(h1, dev, backend, n_updates))
+        backend.close()
+
+    net.stop()
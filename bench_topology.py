@@ -0,0 +1,23 @@
+import sys
+
+from mininet.log import setLogLevel
+
+from topo_modified import create_topology
+
+# Bring-up time of the emulation topology, to catch startup regressions.
+# Usage: sudo python3 bench_topology.py [n_rounds]
+
+if __name__ == '__main__':
+    n_rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    times = {}
+    for i in range(n_rounds):
+        net = create_topology()
+        setLogLevel('warning')
+        for phase, seconds in net.startup_times.items():
+            times.setdefault(phase, []).append(seconds)
+        net.stop()
+
+    totals = [sum(phases) for phases in zip(*times.values())]
+    for phase, values in list(times.items()) + [("total", totals)]:
+        print(f"{phase:>9}: mean={sum(values) / len(values):.3f}s min={min(values):.3f}s max={max(values):.3f}s")
@@ -0,0 +1,97 @@
+import subprocess
+import glob
+import os
+
+from readiness import PROBE_TIMEOUT_S, file_contains, wait_for
+
+# Packet capture on a Mininet host.
+#
+# The pcap tools only look at headers (and the first QUIC byte, for the spin
+# bit), so the default mode keeps HEADERS_SNAPLEN bytes of QUIC packets only
+# instead of every byte of the bulk transfer. Modes can also rotate files by
+# size (rotate_mb) or time (rotate_s) and compress each file once it is
+# closed; the last file is compressed after capture stops.
+#
+#   full:     every packet, whole frames (what tcpdump -w did before)
+#   headers:  UDP port 4434 only, first HEADERS_SNAPLEN bytes of each frame
+#   rotating: headers, in 100 MB files, each gzipped when closed
+
+# Ethernet 14 + IPv4 20 + UDP 8 + 22 bytes of QUIC: the first byte, and the
+# version and connection IDs of long headers
+HEADERS_SNAPLEN = 64
+QUIC_FILTER = "udp port 4434"
+
+CAPTURE_MODES = {
+    "full": {},
+    "headers": {"snaplen": HEADERS_SNAPLEN, "filter": QUIC_FILTER},
+    "rotating": {"snaplen": HEADERS_SNAPLEN, "filter": QUIC_FILTER, "rotate_mb": 100, "compress": "gzip"},
+}
+
+COMPRESSED_SUFFIXES = (".gz", ".xz", ".zst", ".bz2")
+
+class Capture:
+    def __init__(self, host, intf, pcap, mode = "headers", **settings):
+        self.host = host
+        self.intf = intf
+        self.settings = {**CAPTURE_MODES[mode], **settings}
+        self.base, _ = os.path.splitext(pcap)
+        # With time rotation tcpdump names each file by its start time
+        self.pcap = f"{self.base}_%Y%m%d-%H%M%S.pcap" if self.settings.get("rotate_s") else pcap
+        self.log_path = f"{self.base}.tcpdump.log"
+        self.pid = None
+
+    def command(self):
+        s = self.settings
+        args = ["tcpdump", "-U", "-i", self.intf, "-w", self.pcap]
+        if s.get("snaplen"): args += ["-s", str(s["snaplen"])]
+        if s.get("rotate_mb"): args += ["-C", str(s["rotate_mb"])]
+        if s.get("rotate_s"): args += ["-G", str(int(s["rotate_s"]))]
+        if s.get("rotate_mb") or s.get("rotate_s"):
+            # Stay root so files opened after rotation land in the run directory
+            args += ["-Z", "root"]
+            if s.get("compress"): args += ["-z", s["compress"]]
+        if s.get("filter"): args.append(f"'{s['filter']}'")
+        return " ".join(args)
+
+    def start(self, timeout = PROBE_TIMEOUT_S):
+        """Start tcpdump and wait until it is capturing. Returns seconds waited."""
+        if os.path.exists(self.log_path): os.remove(self.log_path)
+        self.pid = int(self.host.cmd(f"{self.command()} 2> {self.log_path} & echo $!").split()[-1])
+        return wait_for(lambda: file_contains(self.log_path, "listening on"), f"tcpdump on {self.intf}", timeout)
+
+    def stop(self, timeout = PROBE_TIMEOUT_S):
+        """
+        Stop this tcpdump (not the other hosts' or copies') and wait until it
+        has flushed its last file and exited; then compress what is left.
+        Returns seconds waited for the flush, or None if it never started or
+        had already exited.
+        """
+        if self.pid is None: return None
+        status = self.host.cmd(f"kill {self.pid} 2>/dev/null; echo kill-exit=$?").rpartition("kill-exit=")[2].strip()
+        if status != "0" and not file_contains(self.log_path, "packets captured"):
+            # Already gone (e.g. it failed to start): nothing left to flush
+            flushed = None
+        else:
+            flushed = wait_for(lambda: file_contains(self.log_path, "packets captured"), "pcap flush", timeout)
+        self.pid = None
+        compress = self.settings.get("compress")
+        if compress:
+            # -z only runs for files closed by rotation; the ones its children
+            # are still compressing (or have a compressed copy of) are left to them
+            busy = self.compressing(compress)
+            left = [path for path in self.files() if not path.endswith(COMPRESSED_SUFFIXES)
+                    and os.path.normpath(path) not in busy
+                    and not any(os.path.exists(path + suffix) for suffix in COMPRESSED_SUFFIXES)]
+            if left: subprocess.run([compress, *left], check = False)
+        return flushed
+
+    def compressing(self, compress):
+        """Files of this capture that a compress process (tcpdump's -z child) still has open."""
+        base = os.path.normpath(self.base)
+        args = [os.path.normpath(arg) for line in self.host.cmd(f"pgrep -a -x {os.path.basename(compress)}").splitlines()
+                for arg in line.split()[2:]]
+        return {arg for arg in args if arg.startswith(base)}
+
+    def files(self):
+        """The capture's files (rotated and compressed ones included), in name order."""
+        return sorted(glob.glob(f"{glob.escape(self.base)}*.pcap*"))
@@ -1,40 +1,153 @@
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import subprocess
+import hashlib
+import json
+import os
 
-def process_logs(path, output, server):
+# Indexes finished runs and converts their picoquic binary logs with
+# picolog_t into <output>/<cid>/<cid>.<side>.{csv,qlog}.
+#
+# Logs are converted in parallel (one process per core). <output>/manifest.json
+# records, per connection and side, the hash of the input log and of the tool
+# it was converted with; a rerun only converts logs whose content or tool
+# changed. Outputs are named by the full connection ID. The run index
+# (run_db.py) is brought up to date first and records the outputs.
+#
+# Each run also checks binlog.py's reading of one converted log against the
+# qlog picolog_t wrote for it (see binlog.check()); --no-convert skips the
+# conversion once the plotters can rely on binlog.py alone.
+#
+#   python3 collect.py                                   # index and convert every run, plus the old shared directories
+#   python3 collect.py --formats qlog algo=bbr trace=victoria   # only matching runs (see run_db.py), qlog only
+#   python3 collect.py --no-convert                      # only index the runs
 
-	print(f"Processing logs in {path}, server={server}")
-	tool = "../picoquic/build/picolog_t"
+TOOL = "../picoquic/build/picolog_t"
+MANIFEST = "manifest.json"
+FORMATS = ("csv", "qlog")
 
-	files = list(path.glob("*.qlog"))
+def file_hash(path):
+	h = hashlib.sha256()
+	with open(path, "rb") as f:
+		for chunk in iter(lambda: f.read(1 << 20), b""):
+			h.update(chunk)
+	return h.hexdigest()
 
-	for file in files:
-		cid = file.stem.split(".")[0][:5]
+def convert(file, output, server, tool, tool_version, previous, formats = FORMATS):
+	"""Convert one log unless previous (its manifest entry) is still valid; returns the new entry."""
+	side = "server" if server else "client"
+	cid = file.name.split(".")[0]
+	outputs = [f"{output}/{cid}/{cid}.{side}.{fmt}" for fmt in formats]
 
-		Path(f"{output}/{cid}/").mkdir(parents=True, exist_ok=True)
+	entry = {"input": str(file), "hash": file_hash(file), "tool": tool_version, "outputs": outputs}
+	if previous and all(previous.get(key) == entry[key] for key in ("hash", "tool", "outputs")) \
+			and all(Path(out).is_file() for out in outputs):
+		return (side, cid), previous, False
 
-		csv_command  = f"{tool} -f csv {file}".split()
-		qlog_command = f"{tool} -f qlog {file}".split()
+	Path(f"{output}/{cid}/").mkdir(parents=True, exist_ok=True)
+	for fmt, out in zip(formats, outputs):
+		command = [tool, "-f", fmt, str(file)]
+		print("#", " ".join(command))
+		# Written under a temporary name so an interrupted conversion is redone
+		try:
+			with open(f"{out}.tmp", "w") as f:
+				subprocess.run(command, stdout = f, check = True)
+		except BaseException:
+			Path(f"{out}.tmp").unlink(missing_ok=True)
+			raise
+		os.replace(f"{out}.tmp", out)
+	return (side, cid), entry, True
 
-		file = f"{output}/{cid}/{cid}.{'server' if server else 'client'}.csv"
-		if not Path(file).is_file():
-			with open(file, "w") as f:
-				print("#", " ".join(csv_command))
-				subprocess.run(csv_command, stdout = f)
+def load_manifest(output):
+	path = Path(output) / MANIFEST
+	if not path.is_file():
+		return {}
+	with open(path) as f:
+		return json.load(f)
 
-		file = f"{output}/{cid}/{cid}.{'server' if server else 'client'}.qlog"
-		if not Path(file).is_file():
-			with open(file, "w") as f:
-				print("#", " ".join(qlog_command))
-				subprocess.run(qlog_command, stdout = f)
+def save_manifest(output, manifest):
+	path = Path(output) / MANIFEST
+	path.parent.mkdir(parents=True, exist_ok=True)
+	with open(f"{path}.tmp", "w") as f:
+		json.dump(manifest, f, indent = 1)
+	os.replace(f"{path}.tmp", path)
+
+def process_logs(sources, output, tool = TOOL, workers = None, formats = FORMATS):
+	"""sources: [(directory or log file, server)]. Converts every *.qlog in them that changed to formats."""
+	tool_version = file_hash(tool)
+	manifest = load_manifest(output)
+
+	# One job per side and connection ID (the first source listing it wins), so
+	# no two workers write the same outputs
+	jobs = {}
+	for path, server in sources:
+		for file in ([Path(path)] if Path(path).is_file() else sorted(Path(path).glob("*.qlog"))):
+			key = f"{'server' if server else 'client'}:{file.name.split('.')[0]}"
+			if key in jobs:
+				print(f"Skipping {file}: {key} is already converted from {jobs[key][0]}")
+				continue
+			jobs[key] = (file, server)
+	print(f"{len(jobs)} logs, {workers or os.cpu_count()} workers")
+
+	converted, failed = 0, 0
+	try:
+		with ProcessPoolExecutor(max_workers = workers) as pool:
+			futures = {key: pool.submit(convert, file, output, server, tool, tool_version, manifest.get(key), formats)
+				for key, (file, server) in jobs.items()}
+			for key, future in futures.items():
+				try:
+					_, entry, changed = future.result()
+				except (subprocess.CalledProcessError, OSError) as e:
+					# Left out of the manifest, so the next run retries it
+					print(f"Failed to convert {jobs[key][0]}: {e}")
+					manifest.pop(key, None)
+					failed += 1
+					continue
+				manifest[key] = entry
+				converted += changed
+	finally:
+		# Keep every conversion that finished, even if the run was interrupted
+		save_manifest(output, manifest)
+	print(f"Converted {converted}, {len(jobs) - converted - failed} up to date, {failed} failed")
+	return manifest
+
+def check_binlog(manifest):
+	"""Compare binlog.py's RTTs with picolog_t's for the first converted log with a qlog; returns whether they agree."""
+	import binlog
+	for entry in manifest.values():
+		qlogs = [out for out in entry["outputs"] if out.endswith(".qlog")]
+		if not qlogs or not binlog.is_binlog(entry["input"]): continue
+		problems = binlog.check(entry["input"], qlogs[0])
+		print(f"binlog.py vs picolog_t on {entry['input']}: " + ("; ".join(problems) if problems else "RTTs agree"))
+		return not problems
+	return None
 
 if __name__ == "__main__":
-	server_logs = Path("./log/server/slogs")
-	client_logs = Path("./log/client/picoquic_leo/slogs")
+	import argparse
+	import run_db
+
+	parser = argparse.ArgumentParser(description = "Index finished runs and convert their logs with picolog_t.")
+	parser.add_argument("conditions", nargs = "*", metavar = "KEY=VALUE", help = "only convert these runs (see run_db.py)")
+	parser.add_argument("--no-convert", dest = "convert", action = "store_false", help = "only index the runs")
+	parser.add_argument("--formats", default = ",".join(FORMATS), help = "comma separated formats to convert to")
+	parser.add_argument("--tool", default = TOOL)
+	args = parser.parse_args()
+	if args.conditions and not args.convert:
+		# Indexing always covers every run
+		parser.error("conditions select the runs to convert; they do nothing with --no-convert")
 
-	output = Path("./processed_logs")
+	# The runs' logs, selected through the run index (see runs.py, run_db.py)
+	db = run_db.connect()
+	print(f"{run_db.sync(db)} runs added to the index")
+	if args.convert:
+		conditions = dict(run_db.parse_condition(c) for c in args.conditions)
+		sources = [(row["path"], row["role"] == "server") for row in run_db.query(db, **conditions)]
+		# plus the old shared directories, if present
+		if not conditions:
+			for path, server in ((Path("./log/server/slogs"), True), (Path("./log/client/picoquic_leo/slogs"), False)):
+				if path.is_dir():
+					sources.append((path, server))
 
-	process_logs(server_logs, output, server = True)
-	
-	if client_logs != server_logs:
-		process_logs(client_logs, output, server = False)
\ No newline at end of file
+		manifest = process_logs(sources, Path("./processed_logs"), args.tool, formats = tuple(args.formats.split(",")))
+		run_db.record_conversions(db, manifest)
+		check_binlog(manifest)
@@ -0,0 +1,223 @@
+from pathlib import Path
+import socketserver
+import threading
+import argparse
+import socket
+import random
+import json
+import time
+import os
+
+from run_watchdog import RUN_DEADLINE_S, STALL_S
+from telemetry import TelemetrySampler
+from capture import Capture
+import readiness
+import qdisc
+import runs
+
+# Long-lived emulation session: the topology, link engine and handover
+# schedule stay up and runs are requested over a Unix socket, one JSON object
+# per line in each direction.
+#
+#   sudo python3 emu_daemon.py serve [--trace ./victoria.csv]
+#   python3 emu_daemon.py run --algo bbr --offset 0
+#   python3 emu_daemon.py reset | status | shutdown
+#
+# Before every run the session is reset to a clean baseline (shapers
+# reinstalled at the run's trace offset, handover loss cleared, conntrack
+# flushed, stray processes killed) and the result is verified. Each run
+# captures packets on h2 into its run directory, like run_tests.
+
+SOCKET_PATH = "/tmp/starquic_emu.sock"
+
+class EmulationSession:
+    def __init__(self, trace_path, trace_step = 0.1, control_step = 0.1, method = "hold", log_dir = "./log", seed = None,
+                 handover_model = "step", loss_rates = (2, 3), bw_tolerance = 0.0, delay_tolerance = 0.0,
+                 capture_mode = "headers"):
+        # Imported here so clients of the socket don't need Mininet
+        import topo_modified as topo
+        import eventlog
+        self.topo = topo
+        self.eventlog = eventlog
+
+        self.trace_path = trace_path
+        self.trace_step = trace_step
+        self.control_step = control_step
+        # The event log and the runs' own directories (see runs.py) go under log_dir
+        self.log_dir = log_dir
+        self.runs_dir = os.path.join(log_dir, "runs")
+        # Each run's client-side pcap, as in run_tests (see capture.py for the modes)
+        self.capture_mode = capture_mode
+        # Seeds the handover loss draws
+        if seed is not None: random.seed(seed)
+
+        self.net = topo.create_topology()
+        eventlog.open_log(os.path.join(log_dir, "events.bin"))
+        self.r2_lock = threading.Lock()
+        self.r4_lock = threading.Lock()
+        self.engine, self.injector = topo.start_link_engine(self.net, self.r2_lock, self.r4_lock, trace_path,
+                                                           trace_step, control_step, method, handover_model, loss_rates,
+                                                           bw_tolerance, delay_tolerance)
+        self.n_runs = 0
+
+    def reset(self, offset = 0):
+        """Return the emulation to its baseline; returns (seconds taken, problems found)."""
+        start = time.perf_counter()
+        for name in ("h1", "h2"):
+            # Only processes in this host's network namespace: farm copies share the pid namespace
+            host = self.net.get(name)
+            host.cmd(f"pkill --ns {host.pid} --nslist net -f picoquicdemo; pkill --ns {host.pid} --nslist net tcpdump")
+        problems = []
+        for name in ("h1", "h2", "r1", "r2", "r4"):
+            output, _, status = self.net.get(name).cmd("conntrack -F 2>&1; echo conntrack-exit=$?").rpartition("conntrack-exit=")
+            if status.strip() != "0":
+                problems.append(f"{name}: conntrack -F failed (exit {status.strip()}): {output.strip()}")
+
+        def reinstall():
+            # On the engine thread, so it cannot interleave with a tick or a handover
+            self.injector.set_loss(0)
+            for shaper in qdisc.shapers(): shaper.reset()
+            # Applies the offset's row to the freshly reset shapers
+            self.engine.seek(int(round(offset * self.trace_step / self.control_step)))
+
+        try:
+            self.engine.call(reinstall)
+        except Exception as e:
+            # Reported instead of raised so the daemon keeps answering (the checks below say what is left)
+            problems.append(f"reinstall failed: {type(e).__name__}: {e}")
+
+        problems += self.injector.verify()
+        for shaper in qdisc.shapers(): problems += shaper.verify()
+        return time.perf_counter() - start, problems
+
+    def run(self, algo = "bbr", offset = 0, test_server = None, request_file = "data4.bin",
+            deadline_s = RUN_DEADLINE_S, stall_s = STALL_S):
+        reset_s, problems = self.reset(offset)
+        if problems:
+            return {"ok": False, "reset_s": reset_s, "problems": problems}
+
+        i = self.n_runs
+        self.n_runs += 1
+        run = runs.new_run(self.runs_dir, f"{i}_{algo}")
+        test_server = test_server or self.topo.PICOQUICDEMO
+        server_command, client_command = self.topo.picoquic_commands(algo, test_server, request_file = request_file,
+                                                                     **run.picoquic_paths())
+        timings = {}
+        capture = Capture(self.net.get("h2"), "h2-eth0", run.pcap, self.capture_mode)
+        try:
+            timings["capture_ready_s"] = capture.start()
+        except readiness.ProbeTimeout as e:
+            timings["error"] = str(e)
+        late = self.topo.sleep_until_ts(self.topo.next_handover_ts())
+        try:
+            self.engine.seek(int(round(offset * self.trace_step / self.control_step)))
+        except RuntimeError as e:
+            # The engine is gone: the link would not follow the trace
+            timings["error"] = str(e)
+
+        first_error = self.engine.n_errors
+        self.eventlog.log(self.eventlog.RUN_START, i, offset, flush = True)
+        sampler = TelemetrySampler(self.net, os.path.join(run.path, "telemetry.bin"))
+        sampler.start()
+        start = time.time()
+        duration = None
+        if "error" not in timings:
+            try:
+                duration = self.topo.run_test(self.net, server_command, client_command, timings, run.path, deadline_s, stall_s)
+            except readiness.ProbeTimeout as e:
+                timings["error"] = str(e)
+        end = time.time()
+        self.eventlog.log(self.eventlog.RUN_END, i, flush = True)
+        telemetry = sampler.stop()
+        timings["engine"] = self.engine.health(first_error)
+        try:
+            timings["pcap_flush_s"] = capture.stop()
+        except readiness.ProbeTimeout as e:
+            timings["pcap_error"] = str(e)
+        manifest = run.finish(run = i, algo = algo, server = test_server, trace = self.trace_path, offset = offset,
+                              start = start, end = end, duration_s = duration, start_late_s = late, reset_s = reset_s,
+                              telemetry = telemetry, **timings)
+        # A run the watchdog stopped is still a result (timed_out says why); one that never started is not
+        return {"ok": "error" not in timings, "run": i, "algo": algo, "offset": offset, "reset_s": reset_s, "start_late_s": late,
+                "duration_s": duration, "run_dir": run.path, "cid": manifest["cid"], **timings}
+
+    def status(self):
+        return {"ok": True, "runs": self.n_runs, "tick_lag": self.engine.clock.lag_summary(),
+                "handover_lag": self.topo.handover_schedule.lag_summary(), "outages": self.injector.summary(),
+                "engine": self.engine.health()}
+
+    def close(self):
+        self.engine.stop()
+        self.engine.join()
+        qdisc.close_backends()
+        self.eventlog.close_log()
+        self.net.stop()
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                response = self.server.dispatch(request)
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            self.wfile.write((json.dumps(response) + "\n").encode())
+            if response.get("shutdown"): break
+
+class EmulationServer(socketserver.UnixStreamServer):
+    def __init__(self, path, session):
+        if os.path.exists(path): os.unlink(path)
+        super().__init__(path, RequestHandler)
+        self.session = session
+        # One request at a time: runs share the topology
+        self.lock = threading.Lock()
+
+    def dispatch(self, request):
+        cmd = request.get("cmd")
+        with self.lock:
+            if cmd == "run":
+                return self.session.run(request.get("algo", "bbr"), int(request.get("offset", 0)), request.get("server"),
+                                        deadline_s = float(request.get("deadline_s", RUN_DEADLINE_S)),
+                                        stall_s = float(request.get("stall_s", STALL_S)))
+            if cmd == "reset":
+                reset_s, problems = self.session.reset(int(request.get("offset", 0)))
+                return {"ok": not problems, "reset_s": reset_s, "problems": problems}
+            if cmd == "status":
+                return self.session.status()
+            if cmd == "shutdown":
+                threading.Thread(target = self.shutdown).start()
+                return {"ok": True, "shutdown": True}
+        return {"ok": False, "error": f"unknown command {cmd!r}"}
+
+def request(payload, path = SOCKET_PATH):
+    """Send one request to a running daemon and return its response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall((json.dumps(payload) + "\n").encode())
+        return json.loads(sock.makefile().readline())
+
+def serve(trace_path, path = SOCKET_PATH):
+    session = EmulationSession(trace_path)
+    server = EmulationServer(path, session)
+    print(f"Emulation daemon listening on {path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        Path(path).unlink(missing_ok = True)
+        session.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Persistent StarQUIC emulation session.")
+    parser.add_argument("cmd", choices = ["serve", "run", "reset", "status", "shutdown"])
+    parser.add_argument("--socket", default = SOCKET_PATH)
+    parser.add_argument("--trace", default = "./victoria.csv")
+    parser.add_argument("--algo", default = "bbr")
+    parser.add_argument("--offset", type = int, default = 0, help = "trace rows")
+    parser.add_argument("--server", default = None, help = "picoquicdemo binary for the server")
+    args = parser.parse_args()
+
+    if args.cmd == "serve":
+        serve(args.trace, args.socket)
+    else:
+        print(json.dumps(request({"cmd": args.cmd, "algo": args.algo, "offset": args.offset, "server": args.server}, args.socket), indent = 1))
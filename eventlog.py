@@ -0,0 +1,150 @@
+from pathlib import Path
+import threading
+import struct
+import time
+import zlib
+import os
+
+import numpy as np
+
+# Ground-truth emulator event log.
+#
+# Append-only file of fixed 40-byte little-endian records, each stamped with
+# both CLOCK_REALTIME (to line up with qlog/pcap timestamps) and
+# CLOCK_MONOTONIC (to measure intervals):
+#
+#   kind u16 | link u16 | pad u32 | realtime_ns i64 | monotonic_ns i64 | v0 f64 | v1 f64
+#
+# LINK_NAME records carry an interface name (up to 16 bytes) in place of
+# v0/v1 and define the link ids used by TC_UPDATE records. Link ids are a hash
+# of the name, so they stay the same across the sessions appending to one log.
+
+RUN_START = 1       # v0 = run index, v1 = trace offset (rows)
+RUN_END = 2         # v0 = run index
+HANDOVER_START = 3  # v0 = loss %, v1 = intended instant (realtime s)
+HANDOVER_END = 4    # v0 = loss % restored
+TC_UPDATE = 5       # link, v0 = bandwidth (Mbit/s), v1 = delay (ms)
+LINK_NAME = 6       # link, name
+
+KIND_NAMES = {RUN_START: "run_start", RUN_END: "run_end", HANDOVER_START: "handover_start",
+              HANDOVER_END: "handover_end", TC_UPDATE: "tc_update", LINK_NAME: "link_name"}
+
+RECORD = struct.Struct("<HHIqqdd")
+NAME_RECORD = struct.Struct("<HHIqq16s")
+DTYPE = np.dtype([("kind", "<u2"), ("link", "<u2"), ("pad", "<u4"), ("realtime_ns", "<i8"),
+                  ("monotonic_ns", "<i8"), ("v0", "<f8"), ("v1", "<f8")])
+
+DEFAULT_PATH = "./log/events.bin"
+# The same log for scripts run from elsewhere (qlog2graph/, pcap2graph/)
+REPO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "log", "events.bin")
+
+class EventLogWriter:
+    def __init__(self, path = DEFAULT_PATH):
+        Path(path).parent.mkdir(parents = True, exist_ok = True)
+        self.path = path
+        self.file = open(path, "ab")
+        self.lock = threading.Lock()
+        self.links = set()
+
+    def write(self, kind, v0 = 0.0, v1 = 0.0, link = 0, flush = False):
+        record = RECORD.pack(kind, link, 0, time.time_ns(), time.monotonic_ns(), v0, v1)
+        with self.lock:
+            self.file.write(record)
+            if flush: self.file.flush()
+
+    def link_id(self, name):
+        link = zlib.crc32(name.encode()) & 0xffff
+        if name not in self.links:
+            with self.lock:
+                if name not in self.links:
+                    self.links.add(name)
+                    self.file.write(NAME_RECORD.pack(LINK_NAME, link, 0, time.time_ns(), time.monotonic_ns(), name.encode()[:16]))
+        return link
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+_writer = None
+
+def open_log(path = DEFAULT_PATH):
+    global _writer
+    if _writer is None:
+        _writer = EventLogWriter(path)
+    return _writer
+
+def close_log():
+    global _writer
+    if _writer is not None:
+        _writer.close()
+        _writer = None
+
+def log(kind, v0 = 0.0, v1 = 0.0, link = None, flush = False):
+    """Append an event (no-op unless open_log() was called). link is an interface name."""
+    if _writer is None: return
+    _writer.write(kind, v0, v1, 0 if link is None else _writer.link_id(link), flush)
+
+class EventLog:
+    """Read side: the whole log as a realtime-sorted record array with indexed lookups."""
+    def __init__(self, path = DEFAULT_PATH):
+        size = os.path.getsize(path)
+        # A writer may be mid-record; ignore a trailing partial record
+        records = np.fromfile(path, dtype = DTYPE, count = size // DTYPE.itemsize)
+        self.records = records[np.argsort(records["realtime_ns"], kind = "stable")]
+
+        self.link_names = {}
+        for record in self.records[self.records["kind"] == LINK_NAME]:
+            self.link_names[int(record["link"])] = record.tobytes()[24:40].rstrip(b"\0").decode()
+
+        self.by_kind = {}
+        for kind in KIND_NAMES:
+            selected = self.records[self.records["kind"] == kind]
+            self.by_kind[kind] = (selected, selected["realtime_ns"] / 1e9)
+
+    @staticmethod
+    def exists(path = DEFAULT_PATH): return os.path.isfile(path)
+
+    def events(self, kind, t0 = None, t1 = None):
+        """Records of kind with t0 <= realtime (s) <= t1, found by binary search."""
+        selected, times = self.by_kind[kind]
+        lo = 0 if t0 is None else np.searchsorted(times, t0, side = "left")
+        hi = len(times) if t1 is None else np.searchsorted(times, t1, side = "right")
+        return selected[lo:hi]
+
+    def times(self, kind, t0 = None, t1 = None):
+        """Realtime seconds of events of kind within [t0, t1]."""
+        return self.events(kind, t0, t1)["realtime_ns"] / 1e9
+
+    def handovers(self, t0 = None, t1 = None): return self.times(HANDOVER_START, t0, t1)
+
+    def runs(self):
+        """[(run index, start s, end s or None)] in start order."""
+        ends = self.events(RUN_END)
+        end_times = ends["realtime_ns"] / 1e9
+        runs = []
+        for record in self.events(RUN_START):
+            start = float(record["realtime_ns"] / 1e9)
+            # The first end of the same run index after this start
+            later = np.searchsorted(end_times, start, side = "left")
+            match = np.nonzero(ends["v0"][later:] == record["v0"])[0]
+            runs.append((int(record["v0"]), start, float(end_times[later + match[0]]) if len(match) else None))
+        return runs
+
+    def tc_updates(self, link, t0 = None, t1 = None):
+        """(realtime s, bandwidth, delay) arrays of one interface's shaper updates."""
+        records = self.events(TC_UPDATE, t0, t1)
+        records = records[records["link"] == zlib.crc32(link.encode()) & 0xffff]
+        return records["realtime_ns"] / 1e9, records["v0"], records["v1"]
+
+def handover_times(t0, t1, path = DEFAULT_PATH):
+    """Realtime seconds of logged handovers in [t0, t1], or None when there is no log at path."""
+    if not EventLog.exists(path): return None
+    return EventLog(path).handovers(t0, t1)
+
+if __name__ == "__main__":
+    import sys
+    events = EventLog(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH)
+    for kind, name in KIND_NAMES.items():
+        print(f"{name}: {len(events.by_kind[kind][0])}")
+    for run, start, end in events.runs():
+        print(f"run {run}: {start:.6f} - {end if end is None else f'{end:.6f}'}")
@@ -0,0 +1,149 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+from pathlib import Path
+import subprocess
+import argparse
+import hashlib
+import queue
+import json
+import time
+import sys
+import os
+
+# Run many copies of the h1 - r1 - r4 - r2 - h2 emulation at once.
+#
+#   sudo python3 farm.py --algos bbr,starquic --offsets 0,600,1200 --seeds 1,2 --jobs 4
+#
+# Every cell (trace, offset, algorithm, handover model and loss rates, seed)
+# runs in its own worker process, started under `unshare --net`: Mininet
+# creates its veth pairs and host namespaces inside that private network
+# namespace, so each copy has its own namespace set and can reuse the usual
+# node names and 10.0.x.0/24 address plan without clashing with the others.
+# Workers are pinned with taskset to disjoint sets of cores (the first core is
+# left to the orchestrator and the other copies' shell commands), and at most
+# `jobs` run at a time.
+#
+# Each cell writes its qlogs, server log, event log and result.json under
+# <out>/<cell id>/.
+
+FARM_DIR = "./log/farm"
+
+def cell_id(cell):
+    # Readable, plus a digest of everything else that defines the cell (server binary, request file, ...)
+    digest = hashlib.sha1(json.dumps(cell, sort_keys = True).encode()).hexdigest()[:8]
+    loss = "-".join(f"{l:g}" for l in cell["loss_rates"])
+    return f"{Path(cell['trace']).stem}_o{cell['offset']}_{cell['algo']}_{cell['handover']}{loss}_s{cell['seed']}_{digest}"
+
+def make_cells(traces, offsets, algos, seeds, server = None, handovers = ("step",), loss_rates = ((2, 3),),
+               request_file = "data4.bin"):
+    return [{"trace": trace, "offset": offset, "algo": algo, "handover": handover, "loss_rates": list(loss),
+             "seed": seed, "server": server, "file": request_file}
+            for trace, offset, algo, handover, loss, seed in product(traces, offsets, algos, handovers, loss_rates, seeds)]
+
+def core_slots(jobs, cores_per_run = 1, reserve = 1):
+    """Disjoint core lists for at most jobs concurrent workers."""
+    cores = sorted(os.sched_getaffinity(0))
+    if len(cores) > reserve + cores_per_run: cores = cores[reserve:]
+    n_slots = max(1, min(jobs, len(cores) // cores_per_run))
+    return [cores[i * cores_per_run:(i + 1) * cores_per_run] or cores for i in range(n_slots)]
+
+def run_cell(cell, cores, out_dir, timeout = None):
+    """Run one cell in a fresh network namespace pinned to cores; returns its result."""
+    cell_dir = os.path.join(out_dir, cell_id(cell))
+    os.makedirs(cell_dir, exist_ok = True)
+    command = ["taskset", "-c", ",".join(map(str, cores)), "unshare", "--net",
+               sys.executable, os.path.abspath(__file__), "worker", json.dumps(cell), "--out", cell_dir]
+
+    start = time.time()
+    with open(os.path.join(cell_dir, "worker.log"), "w") as output:
+        try:
+            code = subprocess.run(command, stdout = output, stderr = subprocess.STDOUT, timeout = timeout).returncode
+        except subprocess.TimeoutExpired:
+            code = None
+
+    result_path = os.path.join(cell_dir, "result.json")
+    result = {"ok": False}
+    if code == 0 and os.path.isfile(result_path):
+        with open(result_path) as f: result = json.load(f)
+    elif code is None:
+        result["error"] = f"timed out after {timeout}s"
+    else:
+        result["error"] = f"worker exited with {code}, see {cell_dir}/worker.log"
+    result.update(cell = cell, id = cell_id(cell), cores = cores, wall_s = time.time() - start)
+    return result
+
+def run_farm(cells, jobs = 2, cores_per_run = 1, out_dir = FARM_DIR, timeout = None, on_result = None):
+    """
+    Run cells with at most jobs workers, each on its own cores; returns results
+    in cell order. on_result(result) is called as each cell finishes.
+    """
+    slots = queue.Queue()
+    for cores in core_slots(jobs, cores_per_run): slots.put(cores)
+    print(f"Running {len(cells)} cells, {slots.qsize()} at a time")
+
+    def work(cell):
+        # The worker is a separate process; this thread only holds its core slot
+        cores = slots.get()
+        try:
+            result = run_cell(cell, cores, out_dir, timeout)
+        finally:
+            slots.put(cores)
+        print(f"{result['id']}: {'ok' if result['ok'] else result.get('error', 'failed')} ({result['wall_s']:.1f}s)")
+        if on_result: on_result(result)
+        return result
+
+    with ThreadPoolExecutor(max_workers = slots.qsize()) as pool:
+        results = list(pool.map(work, cells))
+
+    os.makedirs(out_dir, exist_ok = True)
+    with open(os.path.join(out_dir, "results.json"), "w") as f:
+        json.dump(results, f, indent = 1)
+    return results
+
+def worker(cell, out_dir):
+    """Body of one worker process (already inside its own network namespace)."""
+    from emu_daemon import EmulationSession
+
+    session = EmulationSession(cell["trace"], log_dir = out_dir, seed = cell["seed"],
+                               handover_model = cell.get("handover", "step"), loss_rates = cell.get("loss_rates", (2, 3)))
+    try:
+        result = session.run(cell["algo"], cell["offset"], cell.get("server"), cell.get("file", "data4.bin"),
+                             **{key: cell[key] for key in ("deadline_s", "stall_s") if key in cell})
+    finally:
+        session.close()
+
+    with open(os.path.join(out_dir, "result.json"), "w") as f:
+        json.dump(result, f, indent = 1)
+
+def int_list(text): return [int(x) for x in text.split(",")]
+
+def float_list(text): return [float(x) for x in text.split(",")]
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "worker":
+        parser = argparse.ArgumentParser()
+        parser.add_argument("worker")
+        parser.add_argument("cell")
+        parser.add_argument("--out", required = True)
+        args = parser.parse_args()
+        worker(json.loads(args.cell), args.out)
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description = "Run emulation cells in parallel, isolated topologies.")
+    parser.add_argument("--traces", default = "./victoria.csv", help = "comma separated trace paths")
+    parser.add_argument("--offsets", type = int_list, default = [0], help = "comma separated trace rows")
+    parser.add_argument("--algos", default = "bbr", help = "comma separated -G algorithms")
+    parser.add_argument("--seeds", type = int_list, default = [0])
+    parser.add_argument("--handover", default = "step", choices = ["step", "outage", "none"])
+    parser.add_argument("--loss-rates", type = float_list, default = [2, 3], help = "comma separated handover loss %%")
+    parser.add_argument("--server", default = None, help = "picoquicdemo binary for the server")
+    parser.add_argument("--jobs", type = int, default = 2, help = "maximum concurrent topologies")
+    parser.add_argument("--cores-per-run", type = int, default = 1)
+    parser.add_argument("--timeout", type = float, default = None, help = "seconds per cell")
+    parser.add_argument("--out", default = FARM_DIR)
+    args = parser.parse_args()
+
+    cells = make_cells(args.traces.split(","), args.offsets, args.algos.split(","), args.seeds, args.server,
+                       [args.handover], [args.loss_rates])
+    results = run_farm(cells, args.jobs, args.cores_per_run, args.out, args.timeout)
+    print(f"{sum(r['ok'] for r in results)}/{len(results)} cells ok")
@@ -0,0 +1,187 @@
+from contextlib import ExitStack
+from collections import deque
+import threading
+import heapq
+import math
+import time
+
+import eventlog
+import instrument
+import qdisc
+
+# Starlink reconfigures its satellite-to-user assignment every 15 s, at these
+# seconds of every minute. Shared by the emulator's handover timing and the
+# synthetic trace generator so both use the same grid.
+HANDOVER_OFFSETS_S = (12, 27, 42, 57)
+HANDOVER_PERIOD_S = 15
+
+# What a handover does to the r2 - r4 link:
+#   step:   loss drawn from the loss rates is set and held until the next handover
+#   outage: loss is set for HANDOVER_OUTAGE_S, then restored to 0%
+#   none:   no handovers
+HANDOVER_MODELS = ("step", "outage", "none")
+HANDOVER_LOSS_RATES = (2, 3)
+HANDOVER_OUTAGE_S = 0.1
+# Outage windows an OutageInjector keeps for its summary
+MAX_OUTAGES = 4096
+
+# The last PRECISE_WAIT_S before an instant is waited out in a yielding spin
+# instead of a sleep, so wake-up error is the spin granularity, not the
+# scheduler's timer slack.
+PRECISE_WAIT_S = 0.002
+
+def sleep_until(ts, precise_wait = PRECISE_WAIT_S):
+    """Sleep until wall-clock time ts. Returns how late it woke (s)."""
+    remaining = ts - time.time()
+    if remaining > precise_wait:
+        time.sleep(remaining - precise_wait)
+    while time.time() < ts:
+        time.sleep(0) # releases the GIL while spinning
+    return time.time() - ts
+
+class HandoverSchedule:
+    """
+    Upcoming handover instants (wall clock) kept in a heap.
+
+    offsets are seconds into each cycle_s-long cycle, aligned to the epoch
+    (and so to local minutes for cycle_s = 60). The heap is refilled one cycle
+    at a time, so finding the next instant never builds datetimes or scans
+    candidates. wait() records how late (actual - intended fire time) each
+    event fired, keeping the last LagBuffer capacity of them.
+    """
+    def __init__(self, offsets = HANDOVER_OFFSETS_S, cycle_s = 60.0):
+        self.offsets = sorted(o % cycle_s for o in offsets)
+        self.cycle_s = cycle_s
+        self.next_cycle = math.floor(time.time() / cycle_s) * cycle_s
+        self.heap = []
+        self.lock = threading.Lock()
+        self.fired = instrument.LagBuffer()
+        self.refill()
+        self.refill()
+
+    @classmethod
+    def periodic(cls, period_s = HANDOVER_PERIOD_S, phase_s = HANDOVER_OFFSETS_S[0]):
+        return cls([phase_s], period_s)
+
+    def refill(self):
+        for offset in self.offsets:
+            heapq.heappush(self.heap, self.next_cycle + offset)
+        self.next_cycle += self.cycle_s
+
+    def next_after(self, now = None):
+        """The first handover instant strictly after now (default: time.time())."""
+        now = time.time() if now is None else now
+        with self.lock:
+            while True:
+                while self.heap and self.heap[0] <= now:
+                    heapq.heappop(self.heap)
+                if len(self.heap) > len(self.offsets): return self.heap[0]
+                self.refill()
+
+    def wait(self, ts):
+        """Wait precisely for handover instant ts and record how late it fired."""
+        lag = sleep_until(ts)
+        self.fired.append(lag)
+        return lag
+
+    def wait_next(self):
+        ts = self.next_after()
+        self.wait(ts)
+        return ts
+
+    def lag_summary(self):
+        summary = self.fired.summary()
+        if summary is None: return "no handovers"
+        n, _, p50, p99, worst = summary
+        return f"n={n} p50={p50:.3f}ms p99={p99:.3f}ms max={worst:.3f}ms"
+
+class OutageInjector:
+    """
+    Handover loss on both ends of a link, changed in place.
+
+    TCLink.config(loss=...) deletes and rebuilds the interface's whole tc tree
+    through several shell commands. install() instead puts a netem qdisc
+    (handle 10:, where Mininet would put it) on each end once; set_loss() then
+    only changes its loss through the nodes' qdisc backends. outage() holds the
+    loss for a requested window and records the window actually applied;
+    begin() and end() do the same for callers that schedule the end themselves
+    (the LinkEngine). The last MAX_OUTAGES windows are kept.
+    """
+    def __init__(self, intf, locks = (), backend = "batch", base_args = ""):
+        self.intfs = [intf.link.intf1, intf.link.intf2]
+        self.locks = locks
+        self.backend_kind = backend
+        self.base_args = f"{base_args} " if base_args else ""
+        self.outages = deque(maxlen = MAX_OUTAGES)
+        self.pending = None
+
+    def netem_parent(self, intf):
+        # Mininet's TCIntf hangs netem below its bandwidth shaper's class 5:1
+        for line in intf.node.cmd(f"tc qdisc show dev {intf}").splitlines():
+            fields = line.split()
+            if len(fields) >= 4 and fields[1] == "netem" and fields[2] == "10:":
+                return fields[4] if fields[3] == "parent" else "root"
+            if len(fields) >= 4 and fields[2] == "5:" and fields[3] == "root":
+                return "5:1"
+        return "root"
+
+    def install(self):
+        self.commands = []
+        for intf in self.intfs:
+            parent = self.netem_parent(intf)
+            where = "root" if parent == "root" else f"parent {parent}"
+            backend = qdisc.get_backend(intf.node, self.backend_kind)
+            backend.apply([f"qdisc replace dev {intf} {where} handle 10: netem {self.base_args}loss 0%"])
+            self.commands.append((backend, f"qdisc change dev {intf} {where} handle 10: netem {self.base_args}loss {{loss}}%"))
+        return self
+
+    def set_loss(self, loss):
+        """Set loss on both ends; returns the wall-clock time it took effect."""
+        with ExitStack() as stack:
+            for lock in self.locks: stack.enter_context(lock)
+            with instrument.span("loss_config"):
+                for backend, command in self.commands:
+                    backend.apply([command.format(loss = loss)])
+        return time.time()
+
+    def verify(self):
+        """Problems with the handover qdiscs (empty when both ends are installed with no loss)."""
+        problems = []
+        for intf in self.intfs:
+            lines = [line for line in intf.node.cmd(f"tc qdisc show dev {intf}").splitlines() if line.startswith("qdisc netem 10:")]
+            if not lines:
+                problems.append(f"{intf}: no netem 10: qdisc")
+            elif " loss " in lines[0]:
+                problems.append(f"{intf}: loss still set ({lines[0].strip()})")
+        return problems
+
+    def begin(self, loss, start = None):
+        """Start an outage meant to begin at start (default: now). Returns when the loss took effect."""
+        start = time.time() if start is None else start
+        applied = self.set_loss(loss)
+        eventlog.log(eventlog.HANDOVER_START, loss, start, flush = True)
+        self.pending = (start, applied)
+        return applied
+
+    def end(self, duration_s):
+        """End the outage begin() started, which was requested to last duration_s. Returns the applied window."""
+        restored = self.set_loss(0)
+        eventlog.log(eventlog.HANDOVER_END, 0, flush = True)
+        if self.pending is None: return None
+        (start, applied), self.pending = self.pending, None
+        self.outages.append((start, duration_s, applied, restored))
+        return restored - applied
+
+    def outage(self, loss, duration_s, start = None):
+        """Apply loss for duration_s from start (default: now), then restore 0%."""
+        start = time.time() if start is None else start
+        self.begin(loss, start)
+        sleep_until(start + duration_s)
+        return self.end(duration_s)
+
+    def summary(self):
+        if not self.outages: return "no outages"
+        errors = sorted((restored - applied) - duration for _, duration, applied, restored in self.outages)
+        starts = sorted(applied - start for start, _, applied, _ in self.outages)
+        return (f"n={len(errors)} window error p50={errors[len(errors) // 2] * 1e3:+.3f}ms max={errors[-1] * 1e3:+.3f}ms "
+                f"start delay p50={starts[len(starts) // 2] * 1e3:.3f}ms max={starts[-1] * 1e3:.3f}ms")
@@ -0,0 +1,71 @@
+from collections import deque
+import threading
+import time
+
+# Streaming capture of a command started with host.sendCmd().
+#
+# Instead of waitOutput(), which keeps everything the command prints until it
+# exits, OutputStream reads the host's output as it arrives (host.monitor())
+# and writes it to a file line by line, each line prefixed with the
+# time.monotonic() at which it was read. Memory stays bounded: only a partial
+# line, the last few lines (for printing) and the first time of each key
+# event are kept. Key events are lines starting with a KEY_EVENTS prefix.
+
+KEY_EVENTS = {
+    "established": "Connection established.",
+    "received": "Received",
+    "closed": "Connection closed",
+    "error": "Could not",
+}
+
+TAIL_LINES = 20
+MAX_LINE = 64 * 1024
+MONITOR_TIMEOUT_MS = 100
+
+class OutputStream(threading.Thread):
+    def __init__(self, host, path = None, on_event = None, tail_lines = TAIL_LINES):
+        super().__init__(daemon = True)
+        self.host = host
+        self.path = path
+        self.on_event = on_event
+        self.tail = deque(maxlen = tail_lines)
+        self.events = {}
+        self.n_lines = 0
+        self.n_bytes = 0
+        self.partial = ""
+        self.file = None
+        self.start_time = time.monotonic()
+        # When output was last seen, for callers watching for progress
+        self.last_output = self.start_time
+
+    def line(self, text, now):
+        self.n_lines += 1
+        self.tail.append(text)
+        if self.file: self.file.write(f"{now:.6f} {text}\n")
+        for name, prefix in KEY_EVENTS.items():
+            if name not in self.events and text.startswith(prefix):
+                self.events[name] = now - self.start_time
+                if self.on_event: self.on_event(self.host, name, text)
+
+    def feed(self, data, now):
+        self.n_bytes += len(data)
+        self.last_output = now
+        lines = (self.partial + data).split("\n")
+        self.partial = lines.pop()
+        if len(self.partial) > MAX_LINE:
+            lines.append(self.partial)
+            self.partial = ""
+        for text in lines: self.line(text.rstrip("\r"), now)
+
+    def run(self):
+        self.file = open(self.path, "w", buffering = 1) if self.path else None
+        try:
+            while self.host.waiting:
+                data = self.host.monitor(timeoutms = MONITOR_TIMEOUT_MS)
+                if data: self.feed(data, time.monotonic())
+            if self.partial: self.line(self.partial, time.monotonic())
+        finally:
+            if self.file: self.file.close()
+
+    def summary(self):
+        return {"lines": self.n_lines, "bytes": self.n_bytes, "events": self.events}
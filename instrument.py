@@ -0,0 +1,144 @@
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+import threading
+import itertools
+import json
+import time
+
+import numpy as np
+
+# Optional control-plane timing: lock waits, tc applies, loss reconfiguration.
+# Samples (monotonic start, duration, kind) go into a preallocated ring buffer,
+# so recording is a few array stores and never allocates in the control loop.
+# Everything is a no-op until enable() is called.
+
+class LatencyRecorder:
+    def __init__(self, capacity = 1 << 16):
+        self.capacity = capacity
+        self.starts = np.zeros(capacity, dtype = np.int64)
+        self.durations = np.zeros(capacity, dtype = np.int64)
+        self.kinds = np.zeros(capacity, dtype = np.int16)
+        self.kind_ids = {}
+        self.kind_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counter = itertools.count()
+        self.n = 0
+
+    def kind_id(self, kind):
+        kid = self.kind_ids.get(kind)
+        if kid is None:
+            with self.kind_lock:
+                kid = self.kind_ids.setdefault(kind, len(self.kind_ids))
+        return kid
+
+    def record(self, kind, start_ns, duration_ns):
+        # next() on itertools.count is atomic, so concurrent recorders get distinct slots
+        n = next(self.counter)
+        i = n % self.capacity
+        self.starts[i] = start_ns
+        self.durations[i] = duration_ns
+        self.kinds[i] = self.kind_id(kind)
+        self.n = max(self.n, n + 1)
+
+    @contextmanager
+    def span(self, kind):
+        start = time.monotonic_ns()
+        try:
+            yield
+        finally:
+            self.record(kind, start, time.monotonic_ns() - start)
+
+    def samples(self):
+        n = min(self.n, self.capacity)
+        return self.starts[:n].copy(), self.durations[:n].copy(), self.kinds[:n].copy()
+
+    def report(self):
+        _, durations, kinds = self.samples()
+        edges_ms = np.concatenate([[0.0], np.logspace(-3, 3, 25)])
+        report = {"samples": int(self.n), "dropped": max(0, int(self.n) - self.capacity), "kinds": {}}
+        for kind, kid in sorted(self.kind_ids.items()):
+            d = durations[kinds == kid] / 1e6
+            if not len(d): continue
+            counts, _ = np.histogram(d, bins = edges_ms)
+            report["kinds"][kind] = {
+                "count": int(len(d)),
+                "mean_ms": float(d.mean()),
+                "p50_ms": float(np.percentile(d, 50)),
+                "p99_ms": float(np.percentile(d, 99)),
+                "max_ms": float(d.max()),
+                "histogram": {"edges_ms": edges_ms.tolist(), "counts": counts.tolist()},
+            }
+        return report
+
+    def write_report(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents = True, exist_ok = True)
+        report = self.report()
+        path.write_text(json.dumps(report, indent = 1))
+        for kind, stats in report["kinds"].items():
+            print(f"{kind}: n={stats['count']} p50={stats['p50_ms']:.3f}ms p99={stats['p99_ms']:.3f}ms max={stats['max_ms']:.3f}ms")
+        return report
+
+class LagBuffer:
+    """
+    The last capacity values of a series (e.g. how late each tick fired) in a
+    preallocated ring, so long-lived loops can record forever in bounded memory.
+    len() counts every value ever appended; since(n) returns those appended
+    after the first n that are still held.
+    """
+    def __init__(self, capacity = 1 << 16):
+        self.capacity = capacity
+        self.values = np.zeros(capacity, dtype = np.float64)
+        self.counter = itertools.count()
+        self.n = 0
+
+    def append(self, value):
+        n = next(self.counter)
+        self.values[n % self.capacity] = value
+        self.n = max(self.n, n + 1)
+
+    def __len__(self): return self.n
+
+    def since(self, start = 0):
+        start = max(start, self.n - self.capacity)
+        return self.values[np.arange(start, self.n) % self.capacity]
+
+    def summary(self, since = 0):
+        """(count, mean, p50, p99, max) of since(since) in ms, or None if empty."""
+        lags = self.since(since) * 1e3
+        if not len(lags): return None
+        return len(lags), lags.mean(), np.percentile(lags, 50), np.percentile(lags, 99), lags.max()
+
+class InstrumentedLock:
+    """A threading.Lock that records how long each acquire waited."""
+    def __init__(self, name):
+        self.name = f"wait:{name}"
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        if _recorder is None:
+            self.lock.acquire()
+        else:
+            start = time.monotonic_ns()
+            self.lock.acquire()
+            _recorder.record(self.name, start, time.monotonic_ns() - start)
+        return self
+
+    def __exit__(self, *exc): self.lock.release()
+
+_recorder = None
+_null = nullcontext()
+
+def enable(capacity = 1 << 16):
+    global _recorder
+    if _recorder is None:
+        _recorder = LatencyRecorder(capacity)
+    return _recorder
+
+def recorder(): return _recorder
+
+def span(kind):
+    """Time the with-block as kind (no-op unless enabled)."""
+    return _null if _recorder is None else _recorder.span(kind)
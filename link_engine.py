@@ -0,0 +1,154 @@
+from collections import deque
+import threading
+import itertools
+import heapq
+import time
+
+# Failures a LinkEngine keeps for health()
+MAX_ERRORS = 64
+
+class ShapedLink:
+    def __init__(self, shaper, trace, bw_column, delay_column):
+        self.shaper = shaper
+        self.trace = trace
+        self.bw_column = bw_column
+        self.delay_column = delay_column
+
+    def apply(self, tick, clock):
+        row = clock.row(tick, self.trace.shape[1])
+        self.shaper.update(float(self.trace[self.bw_column, row]), float(self.trace[self.delay_column, row]))
+
+class LinkEngine(threading.Thread):
+    """
+    Drives every shaped link from one timer loop.
+
+    All links follow the same ReplayClock and are updated together on each of
+    its deadlines. One-off actions (handovers) are scheduled on the same
+    monotonic timeline and run between ticks, so nothing is torn down or
+    restarted and an extra link costs one more shaper update per tick.
+
+    A link update or action that raises is reported and skipped, so one
+    failing tc command doesn't stop every link; health() says how many did.
+    """
+    def __init__(self, clock):
+        super().__init__(daemon = True)
+        self.clock = clock
+        self.links = []
+        self.events = []
+        self.seq = itertools.count()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.seeks = 0
+        self.n_errors = 0
+        self.errors = deque(maxlen = MAX_ERRORS)
+
+    def add_link(self, shaper, trace, bw_column, delay_column):
+        link = ShapedLink(shaper, trace, bw_column, delay_column)
+        with self.lock:
+            self.links.append(link)
+        return link
+
+    def schedule(self, when, action):
+        """Run action() at monotonic time when."""
+        with self.lock:
+            heapq.heappush(self.events, (when, next(self.seq), action))
+        self.wakeup.set()
+
+    def schedule_at_ts(self, ts, action):
+        """Run action() at wall-clock time ts."""
+        self.schedule(time.monotonic() + (ts - time.time()), action)
+
+    def call(self, action):
+        """Run action() on the engine thread as soon as possible and return its result (or raise its exception)."""
+        if threading.current_thread() is self: return action()
+        if not self.is_alive(): raise RuntimeError("link engine is not running")
+        done = threading.Event()
+        result, error = [], []
+        def run():
+            try:
+                result.append(action())
+            except BaseException as e:
+                error.append(e)
+            finally:
+                done.set()
+        self.schedule(time.monotonic(), run)
+        while not done.wait(0.5):
+            if not self.is_alive(): raise RuntimeError("link engine stopped before running the call")
+        if error: raise error[0]
+        return result[0] if result else None
+
+    def report(self, what, e):
+        self.n_errors += 1
+        self.errors.append((time.time(), what, f"{type(e).__name__}: {e}"))
+        print(f"Link engine: {what} failed: {type(e).__name__}: {e}")
+
+    def health(self, since = 0):
+        """Whether the engine runs and the failures after the first since (e.g. n_errors at a run's start)."""
+        n = self.n_errors - since
+        return {"alive": self.is_alive(), "errors": n,
+                "last_error": self.errors[-1][2] if n and self.errors else None}
+
+    def apply_links(self, tick):
+        with self.lock:
+            links = list(self.links)
+        for link in links:
+            try:
+                link.apply(tick, self.clock)
+            except Exception as e:
+                self.report(f"update of {link.shaper.dev}", e)
+
+    def apply_current(self): self.apply_links(self.clock.tick_at())
+
+    def seek(self, offset, start = None):
+        """
+        Restart the replay at row offset from start (default: now) and apply
+        it right away. Runs on the engine thread, so no tick sees half of it.
+        """
+        def seek():
+            self.clock.seek(offset, start)
+            self.seeks += 1
+            self.apply_current()
+        if self.ident is None:
+            # Not started yet
+            seek()
+        else:
+            self.call(seek)
+
+    def stop(self):
+        self.stopped = True
+        self.wakeup.set()
+
+    def run_due_events(self, now):
+        while True:
+            with self.lock:
+                if not self.events or self.events[0][0] > now: return
+                _, _, action = heapq.heappop(self.events)
+            try:
+                action()
+            except Exception as e:
+                self.report(f"event {getattr(action, '__name__', action)}", e)
+
+    def run(self):
+        self.apply_current()
+
+        while not self.stopped:
+            self.wakeup.clear()
+            seeks = self.seeks
+            tick = self.clock.tick_at() + 1
+            deadline = self.clock.deadline(tick)
+            with self.lock:
+                next_event = self.events[0][0] if self.events else deadline
+
+            wait = min(deadline, next_event) - time.monotonic()
+            if wait > 0: self.wakeup.wait(wait)
+            if self.stopped: break
+
+            now = time.monotonic()
+            self.run_due_events(now)
+
+            # Woken early by schedule(), or a seek moved the timeline: recompute the next deadline
+            if now < deadline or self.seeks != seeks: continue
+
+            self.clock.record_lag(now - deadline)
+            self.apply_links(tick)
@@ -0,0 +1,222 @@
+from collections import OrderedDict
+from pathlib import Path
+import threading
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# Link traces (e.g. victoria.csv) are compiled once into a column-oriented
+# float64 .npy file next to the CSV: trace[column][row]. The compiled file is
+# cached against the source's mtime, size and sha256 and memory-mapped
+# read-only, so every controller in the process shares the same pages and
+# nothing is parsed per tick.
+
+def compiled_paths(csv_path):
+    csv_path = Path(csv_path)
+    stem = csv_path.with_suffix("")
+    return Path(f"{stem}.trace.npy"), Path(f"{stem}.trace.json")
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def parse_csv(csv_path):
+    rows = np.loadtxt(csv_path, delimiter = ",", dtype = np.float64, ndmin = 2)
+    return np.ascontiguousarray(rows.T)
+
+def save_compiled(columns, npy_path, meta_path, meta):
+    """Atomically write a compiled trace and its cache metadata."""
+    tmp = npy_path.with_name(npy_path.name + f".{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, np.ascontiguousarray(columns, dtype = np.float64))
+    os.replace(tmp, npy_path)
+
+    tmp = meta_path.with_name(meta_path.name + f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(meta))
+    os.replace(tmp, meta_path)
+
+def compile_trace(csv_path, force = False):
+    """Compile csv_path unless an up-to-date compiled copy exists. Returns the .npy path."""
+    csv_path = Path(csv_path)
+    if csv_path.suffix == ".npy":
+        # Already compiled (e.g. written by trace_gen.py)
+        return csv_path
+    npy_path, meta_path = compiled_paths(csv_path)
+    st = csv_path.stat()
+
+    meta = None
+    if not force and npy_path.is_file() and meta_path.is_file():
+        meta = json.loads(meta_path.read_text())
+        if meta.get("mtime_ns") == st.st_mtime_ns and meta.get("size") == st.st_size:
+            return npy_path
+
+    digest = file_hash(csv_path)
+    if meta is not None and meta.get("sha256") == digest:
+        # Touched but unchanged: refresh the cheap part of the key only.
+        meta.update(mtime_ns = st.st_mtime_ns, size = st.st_size)
+        meta_path.write_text(json.dumps(meta))
+        return npy_path
+
+    columns = parse_csv(csv_path)
+    print(f"Compiled trace {csv_path} -> {npy_path} ({columns.shape[1]} rows x {columns.shape[0]} columns)")
+    save_compiled(columns, npy_path, meta_path, {
+        "source": str(csv_path), "mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": digest,
+        "rows": int(columns.shape[1]), "columns": int(columns.shape[0]),
+    })
+    return npy_path
+
+_traces = {}
+_traces_lock = threading.Lock()
+
+def load_trace(csv_path):
+    """Return the shared read-only mapping of csv_path's compiled trace (csv_path may be a .npy)."""
+    key = os.path.realpath(csv_path)
+    with _traces_lock:
+        if key not in _traces:
+            _traces[key] = np.load(compile_trace(csv_path), mmap_mode = "r")
+        return _traces[key]
+
+# Smallest parameter changes the shapers can represent: tbf keeps its rate in
+# bytes/s (8 bit/s = 8e-6 Mbit/s) and netem its delay at microsecond
+# resolution as tc prints it (0.001 ms).
+BW_RESOLUTION_MBIT = 8e-6
+DELAY_RESOLUTION_MS = 0.001
+
+RESAMPLE_METHODS = ("hold", "linear", "cubic")
+
+# Output rows a Schedule resamples at a time, and how many such chunks it keeps
+CHUNK_ROWS = 4096
+CACHED_CHUNKS = 4
+
+def resample_rows(trace, native_step, step, method, start, stop, resolution = None, ranges = None):
+    """
+    Rows start..stop of trace resampled to one row per step seconds (see
+    resample()). Only the native rows they need are read, so trace can be the
+    memory-mapped compiled trace. ranges: per-column (min, max) that cubic is
+    clipped to (default: computed from trace).
+    """
+    n = trace.shape[1]
+    # Fractional native row of every output row
+    x = np.arange(start, stop) * (step / native_step)
+    i0 = np.floor(x + 1e-9).astype(np.int64)
+    f = np.clip(x - i0, 0.0, 1.0)
+    i0 %= n
+
+    def rows(i): return np.asarray(trace[:, i], dtype = np.float64)
+
+    if method == "hold":
+        out = rows(i0)
+    elif method == "linear":
+        v0, v1 = rows(i0), rows((i0 + 1) % n)
+        out = v0 + f * (v1 - v0)
+    else:
+        p0, p1 = rows((i0 - 1) % n), rows(i0)
+        p2, p3 = rows((i0 + 1) % n), rows((i0 + 2) % n)
+        f2 = f * f
+        f3 = f2 * f
+        out = 0.5 * ((2.0 * p1) + (p2 - p0) * f + (2.0 * p0 - 5.0 * p1 + 4.0 * p2 - p3) * f2 + (3.0 * p1 - p0 - 3.0 * p2 + p3) * f3)
+        low, high = ranges if ranges is not None else (np.min(trace, axis = 1), np.max(trace, axis = 1))
+        out = np.clip(out, np.asarray(low)[:, None], np.asarray(high)[:, None])
+
+    if resolution is not None:
+        q = np.asarray(resolution, dtype = np.float64)[:, None]
+        out = np.round(out / q) * q
+
+    return np.ascontiguousarray(out)
+
+def resampled_rows(n_rows, native_step, step): return max(1, int(round(n_rows * native_step / step)))
+
+def check_method(method):
+    if method not in RESAMPLE_METHODS:
+        raise ValueError(f"Unknown resample method {method!r}, expected one of {RESAMPLE_METHODS}")
+
+def resample(trace, native_step, step, method = "hold", resolution = None):
+    """
+    Resample a compiled trace (trace[column][row], one row per native_step
+    seconds) to one row per step seconds, all at once. The trace is treated
+    as periodic, like the replay that wraps around it.
+
+    method: "hold" repeats the last native row, "linear" and "cubic"
+    (Catmull-Rom) interpolate between rows; cubic is clipped to each
+    column's original range so it cannot overshoot (e.g. below 0).
+    resolution: per-column quantum the result is rounded to, so rows never
+    differ by less than the shaper can honour.
+
+    The replay uses Schedule instead, which computes the same rows lazily.
+    """
+    check_method(method)
+    return resample_rows(trace, native_step, step, method, 0, resampled_rows(trace.shape[1], native_step, step), resolution)
+
+class Schedule:
+    """
+    A trace resampled to step seconds on demand: schedule[column, row] is
+    resample(...)[column, row], but rows are computed CHUNK_ROWS at a time when
+    first read and only the last CACHED_CHUNKS chunks are kept. A day-long
+    trace at a 10 ms step thus costs a few chunks of memory instead of the
+    whole grid, and building it only scans the trace once (cubic's ranges).
+    """
+    def __init__(self, trace, native_step, step, method = "hold", resolution = None,
+                 chunk_rows = CHUNK_ROWS, cached_chunks = CACHED_CHUNKS):
+        check_method(method)
+        self.trace = trace
+        self.native_step = native_step
+        self.step = step
+        self.method = method
+        self.resolution = resolution
+        self.shape = (trace.shape[0], resampled_rows(trace.shape[1], native_step, step))
+        self.ranges = (np.min(trace, axis = 1), np.max(trace, axis = 1)) if method == "cubic" else None
+        self.chunk_rows = chunk_rows
+        self.cached_chunks = cached_chunks
+        self.chunks = OrderedDict()
+        self.lock = threading.Lock()
+
+    def chunk(self, k):
+        with self.lock:
+            rows = self.chunks.get(k)
+            if rows is not None:
+                self.chunks.move_to_end(k)
+                return rows
+        start = k * self.chunk_rows
+        rows = resample_rows(self.trace, self.native_step, self.step, self.method, start,
+                             min(start + self.chunk_rows, self.shape[1]), self.resolution, self.ranges)
+        with self.lock:
+            self.chunks[k] = rows
+            while len(self.chunks) > self.cached_chunks: self.chunks.popitem(last = False)
+        return rows
+
+    def __getitem__(self, key):
+        column, row = key
+        k, i = divmod(row, self.chunk_rows)
+        return self.chunk(k)[column, i]
+
+def trace_resolution(n_columns, bw_columns):
+    """Quantum of each column: BW_RESOLUTION_MBIT for bandwidth columns, DELAY_RESOLUTION_MS otherwise."""
+    return [BW_RESOLUTION_MBIT if c in bw_columns else DELAY_RESOLUTION_MS for c in range(n_columns)]
+
+_schedules = {}
+
+def load_schedule(csv_path, native_step, step, method = "hold", bw_columns = (0, 1)):
+    """
+    Return csv_path's trace resampled to step seconds (a Schedule over the
+    mapped trace), one per process. With step == native_step and method
+    "hold" this is the mapped trace itself. Either is indexed [column, row].
+    """
+    trace = load_trace(csv_path)
+    if step == native_step and method == "hold":
+        return trace
+
+    key = (os.path.realpath(csv_path), native_step, step, method, tuple(bw_columns))
+    with _traces_lock:
+        if key not in _schedules:
+            _schedules[key] = Schedule(trace, native_step, step, method, trace_resolution(trace.shape[0], bw_columns))
+        return _schedules[key]
+
+if __name__ == "__main__":
+    import sys
+    for path in sys.argv[1:]:
+        compile_trace(path, force = True)
@@ -8,11 +8,16 @@ import os
 import matplotlib.dates as mdates
 from datetime import datetime
 from zoneinfo import ZoneInfo
+import sys
 
-def create_io_graph_with_periodic_lines_datetime(pcap_path, output_image_path, offsets=[12,27,42,57], interval=15):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from eventlog import handover_times, REPO_PATH as EVENT_LOG
+
+def create_io_graph_with_periodic_lines_datetime(pcap_path, output_image_path, offsets=[12,27,42,57], interval=15, event_log=EVENT_LOG):
     """
     pcap内のI/Oグラフを生成し、
-    pcapの開始時刻に最も近い offsets の秒から周期的に赤い縦線を描画。
+    エミュレータのイベントログに記録されたハンドオーバー時刻に赤い縦線を描画。
+    ログが無い場合は pcapの開始時刻に最も近い offsets の秒から周期的に描画。
     x軸は HH:MM:SS 表示。
 
     Args:
@@ -20,6 +25,7 @@ def create_io_graph_with_periodic_lines_datetime(pcap_path, output_image_path, o
         output_image_path (str): 出力画像ファイルのパス
         offsets (list[int]): 0-59秒の候補（例: [12,27,42,57]）
         interval (int): 赤線の周期（秒）
+        event_log (str): エミュレータのイベントログのパス
     """
     if not os.path.exists(pcap_path):
         print(f"エラー: ファイルが見つかりません - {pcap_path}")
@@ -48,15 +54,17 @@ def create_io_graph_with_periodic_lines_datetime(pcap_path, output_image_path, o
     x_values = list(range(first_time, last_time + 1))
     y_values = [packets_per_second.get(t, 0) for t in x_values]
 
-    # --- 最初の赤線を決定 ---
-    sec_of_minute = first_time % 60
-    closest_offset = min(offsets, key=lambda x: abs(x - sec_of_minute))
-    first_red_line = first_time - sec_of_minute + closest_offset
-    if first_red_line < first_time:
-        first_red_line += timedelta(seconds=60)
+    # --- 赤線リスト ---
+    red_line_times = handover_times(float(packets[0].time), float(packets[-1].time), event_log)
+    if red_line_times is None:
+        # イベントログが無い場合は最初の赤線を推定する
+        sec_of_minute = first_time % 60
+        closest_offset = min(offsets, key=lambda x: abs(x - sec_of_minute))
+        first_red_line = first_time - sec_of_minute + closest_offset
+        if first_red_line < first_time:
+            first_red_line += 60
 
-    # 赤線リストを生成
-    red_line_times = list(range(first_red_line, last_time + 1, interval))
+        red_line_times = list(range(first_red_line, last_time + 1, interval))
 
     # --- 日時表示用に変換 ---
     jst = ZoneInfo("Asia/Tokyo")
@@ -91,4 +99,6 @@ pcap_file = 'pcap_logs/client_9.pcap'
 output_image = 'log_img/io_graph_client_9_1.png'
 interval = 15  # 赤線の周期（秒）
 
-create_io_graph_with_periodic_lines_datetime(pcap_file, output_image, offsets=[12,27,42,57], interval=interval)
+event_log = EVENT_LOG
+
+create_io_graph_with_periodic_lines_datetime(pcap_file, output_image, offsets=[12,27,42,57], interval=interval, event_log=event_log)
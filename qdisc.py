@@ -0,0 +1,185 @@
+import subprocess
+import threading
+
+import eventlog
+import instrument
+
+# Pluggable ways of pushing tc commands into a node's namespace.
+#
+#  "cmd"   - the original path: one host.cmd('tc ...') per command, i.e. a
+#            fork/exec plus a round-trip through Mininet's shell pipe.
+#  "batch" - one long-lived `tc -force -batch -` process per node that reads
+#            commands from a pipe, so an update costs a write and a read.
+
+class CmdBackend:
+    name = "cmd"
+
+    def __init__(self, host):
+        self.host = host
+
+    def apply(self, commands):
+        # One shell round-trip for the whole group
+        self.host.cmd("; ".join(f"tc {command}" for command in commands))
+
+    def close(self): pass
+
+class BatchBackend:
+    name = "batch"
+
+    # tc prints nothing for a successful add/change, so every batch is followed
+    # by a cheap show whose output marks that the kernel has applied the batch.
+    # Anything printed before that line is an error report (stderr is merged).
+    BARRIER = "qdisc show dev lo"
+
+    def __init__(self, host):
+        self.host = host
+        self.lock = threading.Lock()
+        self.proc = host.popen(["tc", "-force", "-batch", "-"],
+                               stdin = subprocess.PIPE, stdout = subprocess.PIPE, stderr = subprocess.STDOUT,
+                               universal_newlines = True, bufsize = 1)
+
+    def apply(self, commands):
+        with self.lock:
+            self.proc.stdin.write("".join(f"{command}\n" for command in commands) + self.BARRIER + "\n")
+            self.proc.stdin.flush()
+
+            errors = []
+            while True:
+                line = self.proc.stdout.readline()
+                if not line:
+                    raise RuntimeError(f"tc batch process on {self.host.name} exited")
+                if line.startswith("qdisc "): break
+                errors.append(line.strip())
+
+        if errors:
+            print(f"tc batch on {self.host.name}: {' / '.join(errors)}")
+
+    def close(self):
+        if self.proc.poll() is None:
+            self.proc.stdin.close()
+            self.proc.wait()
+
+BACKENDS = {"cmd": CmdBackend, "batch": BatchBackend}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend(host, kind = "batch"):
+    """Return the shared backend of the given kind for host, falling back to "cmd"."""
+    with _backends_lock:
+        key = (host.name, kind)
+        if key not in _backends:
+            try:
+                _backends[key] = BACKENDS[kind](host)
+            except OSError as e:
+                print(f"Could not start {kind} qdisc backend on {host.name} ({e}), using cmd")
+                _backends[key] = CmdBackend(host)
+        return _backends[key]
+
+def close_backends():
+    with _backends_lock:
+        for backend in _backends.values():
+            backend.close()
+        _backends.clear()
+        _shapers.clear()
+
+class LinkShaper:
+    """
+    The tbf root (bandwidth) + netem child (delay) of one interface.
+
+    Remembers what was last applied and skips parameters that moved by no more
+    than the tolerance (Mbit/s, ms). When both change they are sent to the
+    backend as one group, so they are applied back to back under a single lock
+    hold instead of leaving the link with a mismatched pair between two calls.
+    """
+    def __init__(self, backend, dev, lock, bw_tolerance = 0.0, delay_tolerance = 0.0):
+        self.backend = backend
+        self.dev = dev
+        self.lock = lock
+        self.apply_kind = f"apply:{dev}"
+        self.bw_tolerance = bw_tolerance
+        self.delay_tolerance = delay_tolerance
+
+        self.bw = None
+        self.delay = None
+
+        self.issued = 0
+        self.suppressed = 0
+        self.coalesced = 0
+
+    def tbf(self, action, bw): return f'qdisc {action} dev {self.dev} root handle 1: tbf rate {bw}mbit burst 200k latency 50ms'
+
+    def netem(self, action, delay): return f'qdisc {action} dev {self.dev} parent 1:1 handle 10: netem delay {delay}ms'
+
+    def update(self, bw, delay):
+        if self.bw is None:
+            # First use (or after reset): install the tree
+            commands = [self.tbf("replace", bw), self.netem("replace", delay)]
+            new_bw, new_delay = bw, delay
+        else:
+            commands = []
+            new_bw, new_delay = self.bw, self.delay
+            if abs(bw - self.bw) > self.bw_tolerance:
+                commands.append(self.tbf("change", bw))
+                new_bw = bw
+            if abs(delay - self.delay) > self.delay_tolerance:
+                commands.append(self.netem("change", delay))
+                new_delay = delay
+
+        if not commands:
+            self.suppressed += 1
+            return
+
+        with self.lock, instrument.span(self.apply_kind):
+            self.backend.apply(commands)
+        # Only once tc took it, so a failed update is retried by the next one
+        self.bw, self.delay = new_bw, new_delay
+
+        self.issued += 1
+        if len(commands) > 1: self.coalesced += 1
+        eventlog.log(eventlog.TC_UPDATE, self.bw, self.delay, link = self.dev)
+
+    def reset(self):
+        """Forget the applied state; the next update reinstalls the whole tree."""
+        self.bw = None
+        self.delay = None
+
+    def verify(self):
+        """Problems with the installed tree, as reported by tc (empty when it is as expected)."""
+        out = self.backend.host.cmd(f"tc qdisc show dev {self.dev}")
+        problems = []
+        if not any(line.startswith("qdisc tbf 1: root") for line in out.splitlines()):
+            problems.append(f"{self.dev}: no tbf 1: root qdisc")
+        if not any(line.startswith("qdisc netem 10: parent 1:1") for line in out.splitlines()):
+            problems.append(f"{self.dev}: no netem 10: under 1:1")
+        return problems
+
+    def summary(self):
+        return f"{self.dev}: issued={self.issued} suppressed={self.suppressed} coalesced={self.coalesced}"
+
+_shapers = {}
+
+def get_shaper(host, dev, lock, backend = "batch", bw_tolerance = 0.0, delay_tolerance = 0.0):
+    """
+    Return the shaper of host:dev; it outlives the threads that drive it.
+    Raises ValueError if it already exists with other tolerances.
+    """
+    with _backends_lock:
+        key = (host.name, dev)
+        shaper = _shapers.get(key)
+    if shaper is None:
+        shaper = LinkShaper(get_backend(host, backend), dev, lock, bw_tolerance, delay_tolerance)
+        with _backends_lock:
+            shaper = _shapers.setdefault(key, shaper)
+    if (shaper.bw_tolerance, shaper.delay_tolerance) != (bw_tolerance, delay_tolerance):
+        raise ValueError(f"{host.name}:{dev} is already shaped with tolerances bw={shaper.bw_tolerance} "
+                         f"delay={shaper.delay_tolerance}, not bw={bw_tolerance} delay={delay_tolerance}")
+    return shaper
+
+def shapers():
+    with _backends_lock:
+        return list(_shapers.values())
+
+def shaper_summaries():
+    with _backends_lock:
+        return [shaper.summary() for shaper in _shapers.values()]
@@ -5,26 +5,41 @@ from collections import Counter
 import os
 import sys
 
-def plot_loss_points_count(qlog_file):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+# イベントログ (ハンドオーバー時刻の実測値) と実行インデックスはリポジトリの log/ にある
+from eventlog import handover_times, REPO_PATH as EVENT_LOG
+import run_db
+from binlog import BinLog, is_binlog
+
+def loss_times_from_binlog(log_file, tz):
+    # picoquicのバイナリログ (picoquicdemo -q が書く *.qlog) を picolog_t で変換せずに直接読む
+    log = BinLog(log_file)
+    return [datetime.fromtimestamp(abs_time_us / 1e6, tz=timezone.utc).astimezone(tz)  # 絶対時刻 µs
+            for abs_time_us in log.time[log.select("packet_lost")]]
+
+def plot_loss_points_count(qlog_file, event_log = EVENT_LOG):
     # JSTタイムゾーン
     JST = timezone(timedelta(hours=9))
 
-    with open(qlog_file, "r", encoding="utf-8") as f:
-        qlog = json.load(f)
-
-    trace = qlog["traces"][0]
-    events = trace["events"]
-    ref_time_us = int(trace["common_fields"]["reference_time"])
-
     # loss events 時刻リスト
     loss_times = []
 
-    for ev in events:
-        rel_time_us, category, event_name, data = ev
-        if event_name == "packet_lost":
-            abs_time_us = ref_time_us + rel_time_us
-            ts = datetime.fromtimestamp(abs_time_us / 1e6, tz=timezone.utc).astimezone(JST)
-            loss_times.append(ts)
+    if is_binlog(qlog_file):
+        loss_times = loss_times_from_binlog(qlog_file, JST)
+    else:
+        with open(qlog_file, "r", encoding="utf-8") as f:
+            qlog = json.load(f)
+
+        trace = qlog["traces"][0]
+        events = trace["events"]
+        ref_time_us = int(trace["common_fields"]["reference_time"])
+
+        for ev in events:
+            rel_time_us, category, event_name, data = ev
+            if event_name == "packet_lost":
+                abs_time_us = ref_time_us + rel_time_us
+                ts = datetime.fromtimestamp(abs_time_us / 1e6, tz=timezone.utc).astimezone(JST)
+                loss_times.append(ts)
 
     if not loss_times:
         print("パケットロスイベントは見つかりませんでした。")
@@ -36,22 +51,28 @@ def plot_loss_points_count(qlog_file):
     times_sorted = sorted(counts.keys())
     values = [counts[t] for t in times_sorted]
 
-    # 赤線リスト（例: 12, 27, 42, 57秒に15秒間隔で）
-    offsets = [12, 27, 42, 57]
-    interval = 15
     first_time = times_sorted[0]
     last_time = times_sorted[-1]
 
-    first_red_line = min(
-        dt for dt in [first_time.replace(second=o, microsecond=0) for o in offsets]
-        if dt >= first_time
-    )
-
-    red_line_dt = []
-    t = first_red_line
-    while t <= last_time:
-        red_line_dt.append(t)
-        t += timedelta(seconds=interval)
+    # 赤線リスト: イベントログに記録されたハンドオーバー時刻
+    handovers = handover_times(first_time.timestamp(), last_time.timestamp() + 1, event_log)
+    if handovers is not None:
+        red_line_dt = [datetime.fromtimestamp(ts, tz=JST) for ts in handovers]
+    else:
+        # イベントログが無い場合は推定（例: 12, 27, 42, 57秒に15秒間隔で）
+        offsets = [12, 27, 42, 57]
+        interval = 15
+
+        first_red_line = min(
+            dt for dt in [first_time.replace(second=o, microsecond=0) for o in offsets]
+            if dt >= first_time
+        )
+
+        red_line_dt = []
+        t = first_red_line
+        while t <= last_time:
+            red_line_dt.append(t)
+            t += timedelta(seconds=interval)
 
     # プロット
     plt.figure(figsize=(12,6))
@@ -80,8 +101,8 @@ def plot_loss_points_count(qlog_file):
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python plotLoss.py <qlog_file>")
+        print("Usage: python plotLoss.py <qlog_file, binary log, connection ID or run ID> [event_log]")
         sys.exit(1)
 
-    qlog_file = sys.argv[1]
-    plot_loss_points_count(qlog_file)
+    qlog_file = run_db.resolve_log(sys.argv[1], run_db.REPO_DB_PATH)
+    plot_loss_points_count(qlog_file, sys.argv[2] if len(sys.argv) > 2 else EVENT_LOG)
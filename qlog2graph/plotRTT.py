@@ -4,10 +4,23 @@ import os
 from datetime import datetime, timezone, timedelta
 import sys
 
-def rtt_from_qlog(qlog_file):
-    with open(qlog_file, "r", encoding="utf-8") as f:
-        qlog = json.load(f)
-
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+# イベントログ (ハンドオーバー時刻の実測値) と実行インデックスはリポジトリの log/ にある
+from eventlog import handover_times, REPO_PATH as EVENT_LOG
+import run_db
+# qlogの項目名 → バイナリログの列名
+from binlog import BinLog, is_binlog, QLOG_RTT_FIELDS as BINLOG_RTT_FIELDS
+
+def rtt_from_binlog(log_file, rtt_data, time_list):
+    # picoquicのバイナリログ (picoquicdemo -q が書く *.qlog) を picolog_t で変換せずに直接読む
+    log = BinLog(log_file)
+    rows = log.select("cc_update")
+    for abs_time_us in log.time[rows]:  # 絶対時刻 µs
+        time_list.append(datetime.fromtimestamp(abs_time_us / 1e6, tz=timezone(timedelta(hours=9))))
+    for key, field in BINLOG_RTT_FIELDS.items():
+        rtt_data[key].extend(v / 1000 if v >= 0 else None for v in log[field][rows])  # µs→ms
+
+def rtt_from_qlog(qlog_file, event_log = EVENT_LOG):
     # 各RTT項目を格納する辞書
     rtt_data = {
         "smoothed_rtt": [],
@@ -16,6 +29,13 @@ def rtt_from_qlog(qlog_file):
     }
     time_list = []
 
+    if is_binlog(qlog_file):
+        rtt_from_binlog(qlog_file, rtt_data, time_list)
+        qlog = {}
+    else:
+        with open(qlog_file, "r", encoding="utf-8") as f:
+            qlog = json.load(f)
+
     # traces → eventsを順に走査
     for trace in qlog.get("traces", []):
         ref_time = int(trace.get("common_fields", {}).get("reference_time", 0))  # µs
@@ -43,26 +63,28 @@ def rtt_from_qlog(qlog_file):
         print("No RTT data found in qlog.")
         return
 
-    offsets = [12, 27, 42, 57]  
-    interval = 15
     first_time = time_list[0]
     last_time = time_list[-1]
 
-    sec_of_minute = first_time.second + first_time.microsecond / 1e6
-    closest_offset = min(offsets, key=lambda x: abs(x - sec_of_minute))
-
-    first_red_line = min(
-    dt for dt in [first_time.replace(second=o, microsecond=0) for o in offsets]
-    if dt >= first_time
-    )
+    # 赤線リスト
+    handovers = handover_times(first_time.timestamp(), last_time.timestamp(), event_log)
+    if handovers is not None:
+        red_line_dt = [datetime.fromtimestamp(ts, tz=first_time.tzinfo) for ts in handovers]
+    else:
+        # イベントログが無い場合は最初のイベント時刻から推定する
+        offsets = [12, 27, 42, 57]  
+        interval = 15
 
+        first_red_line = min(
+        dt for dt in [first_time.replace(second=o, microsecond=0) for o in offsets]
+        if dt >= first_time
+        )
 
-    # 赤線リスト
-    red_line_dt = []
-    t = first_red_line
-    while t <= last_time:
-        red_line_dt.append(t)
-        t += timedelta(seconds=interval)
+        red_line_dt = []
+        t = first_red_line
+        while t <= last_time:
+            red_line_dt.append(t)
+            t += timedelta(seconds=interval)
 
     # === プロット ===
     plt.figure(figsize=(12, 6))
@@ -99,7 +121,7 @@ def rtt_from_qlog(qlog_file):
 if __name__ == "__main__":
     args = sys.argv
     if len(args) > 1:
-        qlog_file = args[1]
-        rtt_from_qlog(qlog_file)
+        qlog_file = run_db.resolve_log(args[1], run_db.REPO_DB_PATH)
+        rtt_from_qlog(qlog_file, args[2] if len(args) > 2 else EVENT_LOG)
     else:
-        print("Usage: python plotRTT.py <qlog_file>")
+        print("Usage: python plotRTT.py <qlog_file, binary log, connection ID or run ID> [event_log]")
@@ -8,10 +8,41 @@ import re
 import collections
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+# イベントログ (ハンドオーバー時刻の実測値) と実行インデックスはリポジトリの log/ にある
+from eventlog import handover_times, REPO_PATH as EVENT_LOG
+from binlog import BinLog, is_binlog
+import run_db
+
+LOSS_GROUPING_INTERVAL_SECONDS = 2
+
+def group_losses(loss_times_s):
+    loss_counts = collections.defaultdict(int)
+    for t in loss_times_s:
+        grouped_timestamp_s = (int(t) // LOSS_GROUPING_INTERVAL_SECONDS) * LOSS_GROUPING_INTERVAL_SECONDS
+        loss_counts[datetime.fromtimestamp(grouped_timestamp_s, tz=timezone(timedelta(hours=9)))] += 1
+    return loss_counts
+
+def parse_binlog(log_file):
+    """
+    picoquicのバイナリログを picolog_t で変換せずに読み、parse_qlog と同じ形で返す。
+    """
+    log = BinLog(log_file)
+    rows = log.select("cc_update")
+    rows = rows[log["rtt_sample"][rows] >= 0]
+    rtt_times = [datetime.fromtimestamp(t / 1e6, tz=timezone(timedelta(hours=9))) for t in log.time[rows]]
+    rtt_values = list(log["rtt_sample"][rows] / 1000)  # µs -> ms
+
+    loss_counts = group_losses(log.time[log.select("packet_lost")] / 1e6)
+    loss_times, loss_events = zip(*sorted(loss_counts.items())) if loss_counts else ([], [])
+    return rtt_times, rtt_values, list(loss_times), list(loss_events)
+
 def parse_qlog(qlog_file):
     """
     単一のqlogファイルをパースして、RTTとLoss Eventの時系列データを抽出する。
     """
+    if os.path.isfile(qlog_file) and is_binlog(qlog_file):
+        return parse_binlog(qlog_file)
     try:
         with open(qlog_file, "r", encoding="utf-8") as f:
             qlog = json.load(f)
@@ -21,9 +52,7 @@ def parse_qlog(qlog_file):
 
     rtt_times = []
     rtt_values = []  # latest_rtt を使用
-
-    LOSS_GROUPING_INTERVAL_SECONDS = 2
-    loss_counts = collections.defaultdict(int)
+    loss_times_s = []
 
     for trace in qlog.get("traces", []):
         ref_time = int(trace.get("common_fields", {}).get("reference_time", 0))
@@ -43,11 +72,9 @@ def parse_qlog(qlog_file):
                     rtt_values.append(data["latest_rtt"] / 1000)  # µs -> ms
 
             if category == "recovery" and event_name == "packet_lost":
-                base_timestamp_s = int(time_jst.timestamp())
-                grouped_timestamp_s = (base_timestamp_s // LOSS_GROUPING_INTERVAL_SECONDS) * LOSS_GROUPING_INTERVAL_SECONDS
-                grouping_time = datetime.fromtimestamp(grouped_timestamp_s, tz=timezone(timedelta(hours=9)))
-                loss_counts[grouping_time] += 1
+                loss_times_s.append(abs_time_s)
 
+    loss_counts = group_losses(loss_times_s)
     if loss_counts:
         sorted_losses = sorted(loss_counts.items())
         loss_times, loss_events = zip(*sorted_losses)
@@ -56,7 +83,7 @@ def parse_qlog(qlog_file):
 
     return rtt_times, rtt_values, list(loss_times), list(loss_events)
 
-def plot_combined_data(rtt_times, rtt_values, loss_times, loss_events, output_file):
+def plot_combined_data(rtt_times, rtt_values, loss_times, loss_events, output_file, event_log = EVENT_LOG):
     """
     結合されたデータから2段グラフをプロットし、画像として保存する。
     """
@@ -84,27 +111,32 @@ def plot_combined_data(rtt_times, rtt_values, loss_times, loss_events, output_fi
     ax2.set_ylabel("Loss Events")
     ax2.set_xlabel("Time (s)")
 
-    offsets = [12, 27, 42, 57]  
-    interval = 15
+    handovers = handover_times(first_time_abs.timestamp(), last_time_abs.timestamp(), event_log)
+    if handovers is not None:
+        handover_times_rel = [ts - first_time_abs.timestamp() for ts in handovers]
+    else:
+        # イベントログが無い場合は最初のイベント時刻から推定する
+        offsets = [12, 27, 42, 57]  
+        interval = 15
 
-    try:
-        first_handover_abs = min(
-            dt for dt in [first_time_abs.replace(second=o, microsecond=0) for o in offsets]
-            if dt >= first_time_abs
-        )
-    except ValueError:
-        next_minute = (first_time_abs + timedelta(minutes=1)).replace(second=0, microsecond=0)
-        first_handover_abs = min(
-            dt for dt in [next_minute.replace(second=o, microsecond=0) for o in offsets]
-        )
-
-    handover_times_abs = []
-    t = first_handover_abs
-    while t <= last_time_abs:
-        handover_times_abs.append(t)
-        t += timedelta(seconds=interval)
-        
-    handover_times_rel = [(t - first_time_abs).total_seconds() for t in handover_times_abs]
+        try:
+            first_handover_abs = min(
+                dt for dt in [first_time_abs.replace(second=o, microsecond=0) for o in offsets]
+                if dt >= first_time_abs
+            )
+        except ValueError:
+            next_minute = (first_time_abs + timedelta(minutes=1)).replace(second=0, microsecond=0)
+            first_handover_abs = min(
+                dt for dt in [next_minute.replace(second=o, microsecond=0) for o in offsets]
+            )
+
+        handover_times_abs = []
+        t = first_handover_abs
+        while t <= last_time_abs:
+            handover_times_abs.append(t)
+            t += timedelta(seconds=interval)
+            
+        handover_times_rel = [(t - first_time_abs).total_seconds() for t in handover_times_abs]
         
     for ax in [ax1, ax2]:
         for i, ho_time in enumerate(handover_times_rel):
@@ -126,22 +158,28 @@ def plot_combined_data(rtt_times, rtt_values, loss_times, loss_events, output_fi
     print(f"✅ Combined plot saved to: {output_file}")
 
 
-def main(qlog_dir, output_dir, file_prefix, max_files_to_process=None):
+def main(qlog_dir, output_dir, file_prefix, max_files_to_process=None, qlog_files=None, name=None):
     """
     指定されたディレクトリからqlogファイルを処理し、結合されたグラフを生成する。
     
     Args:
-        qlog_dir (str): qlogファイルが格納されているディレクトリ。
+        qlog_dir (str): qlogファイルが格納されているディレクトリ。qlog_files 指定時は None でよい。
         output_dir (str): 生成されたグラフを保存するディレクトリ。
         file_prefix (str): 処理するqlogファイルのプレフィックス (例: "client", "server")。
         max_files_to_process (int, optional): 処理するファイルの最大数。Noneの場合は全て処理する。
+        qlog_files (list, optional): 処理するファイル (run_db で選んだもの)。指定時はディレクトリを探さない。
+        name (str, optional): 出力ファイル名の先頭。Noneの場合は qlog_dir の名前。
     """
-    file_pattern = os.path.join(qlog_dir, f"{file_prefix}*.qlog")
-    qlog_files = glob.glob(file_pattern)
-
-    def natural_sort_key(s):
-        return [int(text) if text.isdigit() else text.lower() for text in re.split('([0-9]+)', s)]
-    qlog_files.sort(key=natural_sort_key)
+    if qlog_files is None:
+        file_pattern = os.path.join(qlog_dir, f"{file_prefix}*.qlog")
+        source = f"files matching pattern '{file_pattern}'"
+        qlog_files = glob.glob(file_pattern)
+
+        def natural_sort_key(s):
+            return [int(text) if text.isdigit() else text.lower() for text in re.split('([0-9]+)', s)]
+        qlog_files.sort(key=natural_sort_key)
+    else:
+        source = f"{file_prefix} logs selected from the run index"
 
     if max_files_to_process is not None:
         qlog_files_to_process = qlog_files[:max_files_to_process]
@@ -149,7 +187,7 @@ def main(qlog_dir, output_dir, file_prefix, max_files_to_process=None):
         qlog_files_to_process = qlog_files
             
     if not qlog_files_to_process:
-        print(f"No files matching pattern '{file_pattern}' found to process.")
+        print(f"No {source} found to process.")
         return
         
     print(f"Found {len(qlog_files_to_process)} qlog files to process:")
@@ -175,7 +213,7 @@ def main(qlog_dir, output_dir, file_prefix, max_files_to_process=None):
         all_loss_times, all_loss_events = zip(*sorted_loss)
 
     timestamp_str = datetime.now().strftime("%Y%m%d_%H%M")
-    dir_name = os.path.basename(os.path.normpath(qlog_dir))
+    dir_name = name or os.path.basename(os.path.normpath(qlog_dir))
     
     num_files_str = f"_{max_files_to_process}" if max_files_to_process is not None else "_all"
     output_file = os.path.join(output_dir, f"{dir_name}_combined{num_files_str}_{timestamp_str}.png")
@@ -189,13 +227,20 @@ def main(qlog_dir, output_dir, file_prefix, max_files_to_process=None):
     )
 
 if __name__ == "__main__":
+    # 使い方: python plot_combine_all.py [最大ファイル数] [key=value ...]
+    # key=value (例: algo=bbr trace=victoria offset=0) を指定すると、
+    # ディレクトリを探す代わりに実行インデックス (run_db.py) から条件に合う実行のログを選ぶ
+    args = sys.argv[1:]
+    conditions = dict(run_db.parse_condition(a) for a in args if "=" in a)
+    args = [a for a in args if "=" not in a]
+
     max_files = None
-    if len(sys.argv) > 1:
+    if args:
         try:
-            max_files = int(sys.argv[1])
+            max_files = int(args[0])
             print(f"Processing up to {max_files} files for each prefix.")
         except ValueError:
-            print(f"Invalid number '{sys.argv[1]}'. Processing all files.", file=sys.stderr)
+            print(f"Invalid number '{args[0]}'. Processing all files.", file=sys.stderr)
             max_files = None
     else:
         print("No file limit specified. Processing all files.")
@@ -206,5 +251,15 @@ if __name__ == "__main__":
     server_qlog_dir = "../log/server/slogs"
     server_output_dir = "log_img/server"
 
-    main(client_qlog_dir, client_output_dir, "client", max_files_to_process=max_files)
-    main(server_qlog_dir, server_output_dir, "server", max_files_to_process=max_files)
\ No newline at end of file
+    if conditions:
+        db = run_db.connect(run_db.REPO_DB_PATH)
+        run_db.sync(db)
+        # 出力ファイル名には条件を入れる (例: client_algo-bbr_offset-0_combined_all_...)
+        label = "_".join(f"{key}-{value}" for key, value in conditions.items()).replace("/", "").replace(" ", "")
+        for role, output_dir in (("client", client_output_dir), ("server", server_output_dir)):
+            # 読めないログ (空・書き込み途中) は警告を出して飛ばす
+            files = run_db.log_files(db, **{"role": role, **conditions})
+            main(None, output_dir, role, max_files_to_process=max_files, qlog_files=files, name=f"{role}_{label}")
+    else:
+        main(client_qlog_dir, client_output_dir, "client", max_files_to_process=max_files)
+        main(server_qlog_dir, server_output_dir, "server", max_files_to_process=max_files)
@@ -0,0 +1,49 @@
+import time
+
+# Readiness probes replacing fixed sleeps around a run.
+#
+# Probes poll cheap local state instead of spawning commands in the hosts:
+#   - tcpdump's stderr (redirected to a file) for "listening on" once capture
+#     is running, and for "packets captured", printed after it flushed the
+#     pcap and exited (see capture.py);
+#   - /proc/<pid>/net/udp{,6} of a host's shell, which lists the sockets of
+#     that host's network namespace, for the server's UDP port.
+# Every probe gives up after its timeout with ProbeTimeout and otherwise
+# returns how long it waited (s).
+
+PROBE_INTERVAL_S = 0.005
+PROBE_TIMEOUT_S = 5.0
+
+class ProbeTimeout(Exception):
+    pass
+
+def wait_for(ready, what, timeout = PROBE_TIMEOUT_S, interval = PROBE_INTERVAL_S):
+    start = time.monotonic()
+    while not ready():
+        if time.monotonic() - start > timeout:
+            raise ProbeTimeout(f"{what} not ready after {timeout}s")
+        time.sleep(interval)
+    return time.monotonic() - start
+
+def file_contains(path, text):
+    try:
+        with open(path, "rb") as f:
+            return text.encode() in f.read()
+    except FileNotFoundError:
+        return False
+
+def udp_listening(pid, port):
+    """Whether a UDP socket is bound to port in the network namespace of process pid."""
+    suffix = f":{port:04X}"
+    for table in ("udp", "udp6"):
+        try:
+            with open(f"/proc/{pid}/net/{table}") as f:
+                next(f) # header
+                if any(line.split()[1].endswith(suffix) for line in f): return True
+        except FileNotFoundError:
+            pass
+    return False
+
+def wait_server(host, port = 4434, timeout = PROBE_TIMEOUT_S):
+    """Wait until something on host listens on UDP port. Returns seconds waited."""
+    return wait_for(lambda: udp_listening(host.pid, port), f"server on {host.name} udp/{port}", timeout)
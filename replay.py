@@ -0,0 +1,41 @@
+import time
+
+from instrument import LagBuffer
+
+class ReplayClock:
+    """
+    Maps monotonic time to a trace row: row = offset + floor((now - start) / step).
+
+    Controllers sharing a clock always agree on the current row, and one that is
+    restarted (e.g. after a handover) just asks the clock where to resume. Ticks
+    fire on absolute deadlines start + k * step, so time spent applying a row
+    never accumulates into drift. How late each tick fired is recorded (the
+    last LagBuffer capacity ticks are kept).
+    """
+    def __init__(self, step, offset = 0, start = None):
+        self.step = step
+        self.offset = offset
+        self.start = time.monotonic() if start is None else start
+        self.lags = LagBuffer()
+
+    def tick_at(self, now = None):
+        now = time.monotonic() if now is None else now
+        return max(0, int((now - self.start) // self.step))
+
+    def deadline(self, tick): return self.start + tick * self.step
+
+    def row(self, tick, n_rows): return (self.offset + tick) % n_rows
+
+    def seek(self, offset, start = None):
+        """Restart replay at row offset from start (default: now). Not thread-safe: LinkEngine.seek() runs it on the engine thread."""
+        self.offset = offset
+        self.start = time.monotonic() if start is None else start
+
+    def record_lag(self, lag): self.lags.append(lag)
+
+    def lag_summary(self, since = 0):
+        """Tick lag statistics of the ticks after the first since (e.g. len(clock.lags) at a run's start)."""
+        summary = self.lags.summary(since)
+        if summary is None: return "no ticks"
+        n, mean, p50, p99, worst = summary
+        return f"n={n} mean={mean:.3f}ms p50={p50:.3f}ms p99={p99:.3f}ms max={worst:.3f}ms"
@@ -0,0 +1,285 @@
+import sqlite3
+import json
+import sys
+import os
+
+import numpy as np
+
+import runs
+from binlog import BinLog, is_binlog
+
+# SQLite index of finished runs, for selecting logs by condition instead of
+# globbing directories.
+#
+# sync() finds every run root below the database's directory (a directory
+# with a runs.py index: log/runs, and farm.py's and sweep.py's per-cell
+# <cell>/runs), reads the runs' manifests (runs.load_index()) and adds the
+# runs it hasn't seen: one row per run (algorithm, server, trace, offset,
+# timing...) and one per log (role client/server, connection ID, path, size
+# and summary metrics decoded from the binary log with binlog.py). Run IDs are
+# only unique within a root (parallel cells start in the same second), so
+# runs are keyed by (root, id). record_conversions() adds the csv/qlog
+# collect.py converted each log to. Paths are stored relative to the
+# database's directory and returned relative to the current one, so the
+# plotters can open them from anywhere.
+#
+#   python3 run_db.py sync
+#   python3 run_db.py query algo=bbr role=client trace=victoria offset=0
+#   python3 run_db.py query algo=bbr duration_s=:60 --paths
+
+DB_PATH = "./log/runs.db"
+# The same index for scripts run from elsewhere (the plotters in qlog2graph/)
+REPO_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "log", "runs.db")
+
+RUN_COLUMNS = ("algo", "server", "trace", "trace_name", "offset", "start", "end", "duration_s", "timed_out", "error")
+LOG_METRICS = ("events", "packets_sent", "packets_received", "packets_lost", "srtt_p50_ms", "rtt_min_ms", "log_duration_s")
+PATH_COLUMNS = ("path", "qlog", "csv")
+
+# offset, start and end are SQL keywords
+def quoted(columns): return ", ".join(f'"{column}"' for column in columns)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    root TEXT, id TEXT, {quoted(RUN_COLUMNS)}, total_bytes INTEGER, manifest TEXT, PRIMARY KEY (root, id));
+CREATE TABLE IF NOT EXISTS logs (
+    root TEXT, run_id TEXT, role TEXT, cid TEXT, path TEXT, size INTEGER, mtime_ns INTEGER,
+    {", ".join(LOG_METRICS)}, qlog TEXT, csv TEXT, PRIMARY KEY (root, run_id, role));
+CREATE TABLE IF NOT EXISTS files (root TEXT, run_id TEXT, path TEXT, size INTEGER, PRIMARY KEY (root, run_id, path));
+CREATE INDEX IF NOT EXISTS runs_condition ON runs (algo, trace_name, "offset");
+CREATE INDEX IF NOT EXISTS logs_cid ON logs (cid, role);
+"""
+# Bumped when SCHEMA changes; the index is rebuilt from the runs' manifests
+SCHEMA_VERSION = 2
+TABLES = ("runs", "logs", "files")
+
+class RunDB(sqlite3.Connection):
+    # Directory the stored paths are relative to
+    base = "."
+
+def connect(path = DB_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok = True)
+    db = sqlite3.connect(path, factory = RunDB)
+    db.row_factory = sqlite3.Row
+    if db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        for table in TABLES: db.execute(f"DROP TABLE IF EXISTS {table}")
+        db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    db.executescript(SCHEMA)
+    db.base = os.path.dirname(path) or "."
+    return db
+
+def trace_name(trace):
+    """victoria for ./victoria.csv or traces/victoria.trace.npy"""
+    if not trace: return None
+    name = os.path.basename(trace)
+    for suffix in (".trace.npy", ".csv"):
+        if name.endswith(suffix): return name[:-len(suffix)]
+    return os.path.splitext(name)[0]
+
+def log_metrics(path):
+    """Summary metrics of a binary log (LOG_METRICS order), or Nones if it can't be decoded."""
+    if not is_binlog(path): return (None,) * len(LOG_METRICS)
+    try:
+        log = BinLog(path)
+    except (ValueError, OSError):
+        return (None,) * len(LOG_METRICS)
+    counts = log.counts()
+    _, _, srtt, rtt_min = log.rtt()
+    srtt, rtt_min = srtt[srtt >= 0], rtt_min[rtt_min > 0]
+    return (log.n_events, counts.get("packet_sent", 0), counts.get("packet_received", 0), counts.get("packet_lost", 0),
+            float(np.median(srtt)) / 1e3 if len(srtt) else None, float(rtt_min.min()) / 1e3 if len(rtt_min) else None,
+            float(log.time[-1] - log.time[0]) / 1e6 if log.n_events else None)
+
+def add_run(db, root, manifest):
+    run_dir = os.path.join(root, manifest["id"])
+    root_key = os.path.relpath(root, db.base)
+    values = {column: manifest.get(column) for column in RUN_COLUMNS}
+    values["trace_name"] = trace_name(manifest.get("trace"))
+    if values["timed_out"] is not None: values["timed_out"] = str(values["timed_out"])
+    db.execute(f"INSERT OR REPLACE INTO runs (root, id, {quoted(RUN_COLUMNS)}, total_bytes, manifest) "
+               f"VALUES ({', '.join('?' * (len(RUN_COLUMNS) + 4))})",
+               (root_key, manifest["id"], *values.values(), sum(manifest["files"].values()), json.dumps(manifest)))
+    db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                   [(root_key, manifest["id"], os.path.relpath(os.path.join(run_dir, name), db.base), size)
+                    for name, size in manifest["files"].items()])
+    for role in ("client", "server"):
+        name = manifest.get(f"{role}_qlog")
+        if not name: continue
+        path = os.path.join(run_dir, name)
+        if not os.path.isfile(path): continue
+        stat = os.stat(path)
+        db.execute(f"INSERT OR REPLACE INTO logs (root, run_id, role, cid, path, size, mtime_ns, {', '.join(LOG_METRICS)}) "
+                   f"VALUES ({', '.join('?' * (7 + len(LOG_METRICS)))})",
+                   (root_key, manifest["id"], role, os.path.basename(name).split(".")[0], os.path.relpath(path, db.base),
+                    stat.st_size, stat.st_mtime_ns, *log_metrics(path)))
+
+def run_roots(base):
+    """Every directory below base with a runs.py index (runs/, <farm or sweep cell>/runs/, ...)."""
+    roots = []
+    for directory, subdirs, names in os.walk(base):
+        if runs.INDEX_NAME in names:
+            roots.append(directory)
+            # Below a root are only its run directories
+            subdirs[:] = []
+        else:
+            subdirs.sort()
+    return roots
+
+def sync(db, root = None):
+    """Add the runs of root's index (default: every run root below the database) not in it yet. Returns how many were added."""
+    known = {(row["root"], row["id"]) for row in db.execute("SELECT root, id FROM runs")}
+    added = 0
+    for run_root in ([root] if root else run_roots(db.base)):
+        root_key = os.path.relpath(run_root, db.base)
+        for manifest in runs.load_index(run_root):
+            if (root_key, manifest["id"]) in known: continue
+            add_run(db, run_root, manifest)
+            known.add((root_key, manifest["id"]))
+            added += 1
+    db.commit()
+    return added
+
+def record_conversions(db, manifest):
+    """Store the outputs of collect.py (its manifest: {"side:cid": entry}) with the logs they came from."""
+    for key, entry in manifest.items():
+        role, cid = key.split(":", 1)
+        outputs = {os.path.splitext(out)[1][1:]: os.path.relpath(out, db.base) for out in entry["outputs"]}
+        db.execute("UPDATE logs SET qlog = COALESCE(?, qlog), csv = COALESCE(?, csv) WHERE role = ? AND cid = ?",
+                   (outputs.get("qlog"), outputs.get("csv"), role, cid))
+    db.commit()
+
+def where(conditions):
+    """
+    SQL condition and parameters for conditions {column: value}. A value
+    matches exactly; a (low, high) tuple is a range (None for open); a list is
+    any of its values. trace matches a trace path or name, cid a prefix of the
+    connection ID. Columns that are neither run nor log columns are looked
+    up in the run's manifest.
+    """
+    clauses, params = [], []
+    for column, value in conditions.items():
+        if column in ("id", "total_bytes") + RUN_COLUMNS:
+            name, name_params = f'runs."{column}"', []
+        elif column in ("root", "run_id", "role", "cid", "size") + LOG_METRICS + PATH_COLUMNS:
+            name, name_params = f"logs.{column}", []
+        else:
+            name, name_params = "json_extract(runs.manifest, ?)", [f"$.{column}"]
+        def clause(sql, *values):
+            clauses.append(sql)
+            params.extend(name_params + list(values))
+        if isinstance(value, tuple):
+            low, high = value
+            if low is not None: clause(f"{name} >= ?", low)
+            if high is not None: clause(f"{name} <= ?", high)
+        elif isinstance(value, list):
+            clause(f"{name} IN ({', '.join('?' * len(value))})", *value)
+        elif column == "trace":
+            # By path or by name ("victoria")
+            clause(f"({name} = ? OR runs.trace_name = ?)", value, value)
+        elif column == "cid":
+            # A prefix is enough, as in runs.find_run
+            clause(f"{name} LIKE ?", f"{value}%")
+        else:
+            clause(f"{name} = ?", value)
+    return " AND ".join(clauses) or "1", params
+
+def query(db, **conditions):
+    """Logs matching conditions (see where()), with their run's columns, in the order the runs started."""
+    sql_where, params = where(conditions)
+    rows = db.execute(f"SELECT runs.*, logs.* FROM logs JOIN runs ON logs.root = runs.root AND logs.run_id = runs.id "
+                      f"WHERE {sql_where} ORDER BY runs.\"start\", runs.root, runs.id, logs.role", params).fetchall()
+    results = []
+    for row in rows:
+        result = dict(row)
+        result.pop("manifest")
+        for column in PATH_COLUMNS:
+            if result[column]: result[column] = os.path.normpath(os.path.join(db.base, result[column]))
+        results.append(result)
+    return results
+
+# The formats the plotters read, in the order they are preferred: a converted
+# output (PATH_COLUMNS) or "binlog", the run's binary log itself. The qlog
+# comes first until binlog.check() has confirmed binlog.py's reading of the
+# layout against picolog_t on real logs.
+LOG_FORMATS = ("qlog", "binlog")
+
+def preferred(row, formats = LOG_FORMATS):
+    """The first of formats row's log is available in. Raises ValueError naming what is available."""
+    available = {}
+    for fmt in ("qlog", "csv"):
+        if row[fmt] and os.path.isfile(row[fmt]): available[fmt] = row[fmt]
+    if os.path.isfile(row["path"]) and is_binlog(row["path"]): available["binlog"] = row["path"]
+    for fmt in formats:
+        if fmt in available: return available[fmt]
+    raise ValueError(f"{row['root']}/{row['run_id']} {row['role']} (cid {row['cid']}): no {' or '.join(formats)} log, "
+                     f"available: {', '.join(available) or 'none'} (collect.py converts to qlog and csv)")
+
+def log_files(db, formats = LOG_FORMATS, **conditions):
+    """
+    Paths of the matching logs, each in the first of formats it is available
+    in (see preferred()). Logs with none (empty, or still being written) are
+    skipped with a warning.
+    """
+    paths = []
+    for row in query(db, **conditions):
+        try:
+            paths.append(preferred(row, formats))
+        except ValueError as e:
+            print(f"Skipping {e}", file = sys.stderr)
+    return paths
+
+def find_log(db, key, formats = LOG_FORMATS):
+    """Path of the first log of connection ID key (a prefix is enough) or of run key, or None."""
+    rows = query(db, cid = key) or query(db, run_id = key)
+    return preferred(rows[0], formats) if rows else None
+
+def resolve_log(arg, db_path = DB_PATH, formats = LOG_FORMATS):
+    """arg if it is a file, else the log of connection ID or run arg in one of formats (for the plotters' command lines)."""
+    if os.path.isfile(arg): return arg
+    db = connect(db_path)
+    sync(db)
+    try:
+        path = find_log(db, arg, formats)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if path is None: raise SystemExit(f"{arg}: no such file, connection ID or run")
+    return path
+
+def parse_condition(text):
+    """key=value, key=low:high or key=a,b from the command line."""
+    column, _, value = text.partition("=")
+    def number(v):
+        for cast in (int, float):
+            try:
+                return cast(v)
+            except ValueError:
+                pass
+        return v
+    if ":" in value and column not in ("trace", "server"):
+        low, _, high = value.partition(":")
+        return column, (number(low) if low else None, number(high) if high else None)
+    if "," in value: return column, [number(v) for v in value.split(",")]
+    return column, number(value)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description = "Index finished runs in SQLite and select their logs.")
+    parser.add_argument("command", choices = ("sync", "query"))
+    parser.add_argument("conditions", nargs = "*", metavar = "KEY=VALUE", help = "VALUE, LOW:HIGH or A,B")
+    parser.add_argument("--db", default = DB_PATH)
+    parser.add_argument("--root", help = "runs directory (default: every one below the database's directory)")
+    parser.add_argument("--paths", action = "store_true", help = "print only the log paths")
+    args = parser.parse_args()
+
+    db = connect(args.db)
+    added = sync(db, args.root)
+    if args.command == "sync":
+        print(f"{added} runs added")
+    else:
+        conditions = dict(parse_condition(c) for c in args.conditions)
+        if args.paths:
+            for path in log_files(db, **conditions): print(path)
+        else:
+            for row in query(db, **conditions):
+                print(f"{row['root']}/{row['run_id']} {row['role']}: cid={row['cid']} algo={row['algo']} trace={row['trace_name']} "
+                      f"offset={row['offset']} duration={row['duration_s']} srtt_p50={row['srtt_p50_ms']}ms "
+                      f"lost={row['packets_lost']} {row['path']}")
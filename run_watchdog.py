@@ -0,0 +1,89 @@
+import subprocess
+import threading
+import glob
+import time
+import os
+
+from telemetry import read_net_dev
+
+# Per-run watchdog.
+#
+# A transfer that stalls (e.g. under heavy emulated loss) would otherwise
+# block run_test forever. The watchdog checks the run every interval and trips
+# when the run passes its deadline, or when progress (bytes received by the
+# client plus the size of the run's qlogs) has not moved for stall_s. It then
+# interrupts both hosts (SIGINT to their foreground command) and, if that is
+# ignored for KILL_GRACE_S, kills picoquicdemo in their namespaces. The run
+# then finishes normally and reports why it was stopped.
+
+RUN_DEADLINE_S = 600.0
+STALL_S = 30.0
+CHECK_INTERVAL_S = 0.5
+KILL_GRACE_S = 2.0
+
+def transfer_progress(host, dev, qlog_dirs = ()):
+    """A function returning a number that grows while the transfer makes progress."""
+    def progress():
+        try:
+            rx_bytes = read_net_dev(host.pid).get(dev, (0,))[0]
+        except FileNotFoundError:
+            rx_bytes = 0
+        qlog_bytes = 0
+        for directory in qlog_dirs:
+            for path in glob.glob(os.path.join(glob.escape(directory), "*.qlog")):
+                try:
+                    qlog_bytes += os.path.getsize(path)
+                except FileNotFoundError:
+                    pass
+        return rx_bytes + qlog_bytes
+    return progress
+
+class RunWatchdog(threading.Thread):
+    def __init__(self, hosts, progress = None, deadline_s = RUN_DEADLINE_S, stall_s = STALL_S,
+                 interval = CHECK_INTERVAL_S):
+        super().__init__(daemon = True)
+        self.hosts = hosts
+        self.progress = progress
+        self.deadline_s = deadline_s
+        self.stall_s = stall_s
+        self.interval = interval
+        self.done = threading.Event()
+        # None, or why the run was stopped ("deadline" / "stalled")
+        self.reason = None
+
+    def check(self, start, now, last_value, last_change):
+        """(reason to stop or None, progress value, when it last changed)."""
+        if self.deadline_s and now - start > self.deadline_s:
+            return "deadline", last_value, last_change
+        if self.progress is None or not self.stall_s:
+            return None, last_value, last_change
+        value = self.progress()
+        if value != last_value:
+            return None, value, now
+        return ("stalled" if now - last_change > self.stall_s else None), value, last_change
+
+    def run(self):
+        start = last_change = time.monotonic()
+        last_value = self.progress() if self.progress else None
+        while not self.done.wait(self.interval):
+            now = time.monotonic()
+            self.reason, last_value, last_change = self.check(start, now, last_value, last_change)
+            if self.reason:
+                self.abort()
+                return
+
+    def abort(self):
+        print(f"Watchdog: run {self.reason}, interrupting {', '.join(host.name for host in self.hosts)}")
+        for host in self.hosts:
+            if host.waiting: host.sendInt()
+        if self.done.wait(KILL_GRACE_S): return
+        for host in self.hosts:
+            if host.waiting:
+                # The host's shell is busy, so signal from outside, scoped to its namespace
+                subprocess.run(["pkill", "-9", "--ns", str(host.pid), "--nslist", "net", "-f", "picoquicdemo"], check = False)
+
+    def finish(self):
+        """Stop watching (the run ended); returns why it was stopped, or None."""
+        self.done.set()
+        self.join()
+        return self.reason
@@ -0,0 +1,118 @@
+from pathlib import Path
+import threading
+import json
+import time
+import os
+
+# Per-run output directories.
+#
+# Every transfer gets its own directory, and picoquicdemo is pointed at it
+# (-q for qlogs, -o for the client's downloads, -l for the server log):
+#
+#   <root>/<run id>/client/<cid>.client.qlog, client/out/, client.pcap
+#   <root>/<run id>/server/<cid>.server.qlog, server/server.log
+#   <root>/<run id>/manifest.json
+#
+# so a run's files are found by construction instead of by picking the newest
+# file of a shared directory. finish() writes the manifest (connection ID,
+# trace offset, algorithm, timing, file sizes) and appends it as one line to
+# <root>/index.jsonl, which later processing reads instead of scanning.
+
+RUNS_DIR = "./log/runs"
+INDEX_NAME = "index.jsonl"
+MANIFEST_NAME = "manifest.json"
+
+_index_lock = threading.Lock()
+
+class RunDir:
+    def __init__(self, root, run_id):
+        self.root = root
+        self.id = run_id
+        self.path = os.path.join(root, run_id)
+        self.client = os.path.join(self.path, "client")
+        self.server = os.path.join(self.path, "server")
+        self.pcap = os.path.join(self.path, "client.pcap")
+        for directory in (self.client, self.server, os.path.join(self.client, "out")):
+            os.makedirs(directory, exist_ok = True)
+
+    def picoquic_paths(self):
+        """Keyword arguments of topo_modified.picoquic_commands for this run."""
+        return {"server_qlog_dir": self.server, "server_log_path": os.path.join(self.server, "server.log"),
+                "client_qlog_dir": self.client, "client_out_dir": os.path.join(self.client, "out")}
+
+    def qlogs(self, side):
+        """The qlogs picoquicdemo wrote for side ("client" or "server"); normally exactly one."""
+        directory = self.client if side == "client" else self.server
+        return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".qlog"))
+
+    def files(self):
+        """{path relative to the run directory: size in bytes} of everything the run wrote."""
+        sizes = {}
+        for path in Path(self.path).rglob("*"):
+            if path.is_file() and path.name != MANIFEST_NAME:
+                sizes[str(path.relative_to(self.path))] = path.stat().st_size
+        return sizes
+
+    def finish(self, **fields):
+        """Write the run's manifest (plus fields, e.g. offset/algo/timing) and add it to the index."""
+        client_qlogs, server_qlogs = self.qlogs("client"), self.qlogs("server")
+        qlog = (client_qlogs or server_qlogs or [None])[0]
+        manifest = {
+            "id": self.id,
+            # picoquicdemo names qlogs <initial connection ID>.<side>.qlog
+            "cid": os.path.basename(qlog).split(".")[0] if qlog else None,
+            "client_qlog": os.path.relpath(client_qlogs[0], self.path) if client_qlogs else None,
+            "server_qlog": os.path.relpath(server_qlogs[0], self.path) if server_qlogs else None,
+            **fields,
+            "files": self.files(),
+        }
+
+        tmp = os.path.join(self.path, f".{MANIFEST_NAME}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent = 1)
+        os.replace(tmp, os.path.join(self.path, MANIFEST_NAME))
+
+        with _index_lock:
+            with open(os.path.join(self.root, INDEX_NAME), "a") as f:
+                f.write(json.dumps(manifest) + "\n")
+        return manifest
+
+def new_run(root = RUNS_DIR, label = ""):
+    """A fresh run directory under root, named by start time (and label)."""
+    os.makedirs(root, exist_ok = True)
+    base = time.strftime("%Y%m%d-%H%M%S") + (f"_{label}" if label else "")
+    run_id, n = base, 1
+    while True:
+        try:
+            os.mkdir(os.path.join(root, run_id))
+            return RunDir(root, run_id)
+        except FileExistsError:
+            n += 1
+            run_id = f"{base}_{n}"
+
+def load_index(root = RUNS_DIR):
+    """Manifests of the runs under root, in the order they finished."""
+    path = os.path.join(root, INDEX_NAME)
+    if not os.path.isfile(path): return []
+    runs = []
+    with open(path) as f:
+        for line in f:
+            try:
+                runs.append(json.loads(line))
+            except json.JSONDecodeError:
+                pass # partial last line of an interrupted write
+    return runs
+
+def find_run(root = RUNS_DIR, cid = None, run_id = None):
+    """The manifest of the run with connection ID cid (a prefix is enough) or id run_id, or None."""
+    for manifest in reversed(load_index(root)):
+        if run_id is not None and manifest["id"] == run_id: return manifest
+        if cid is not None and manifest["cid"] and manifest["cid"].startswith(cid): return manifest
+    return None
+
+if __name__ == "__main__":
+    import sys
+    for manifest in load_index(sys.argv[1] if len(sys.argv) > 1 else RUNS_DIR):
+        size = sum(manifest["files"].values())
+        print(f"{manifest['id']}: cid={manifest['cid']} algo={manifest.get('algo')} offset={manifest.get('offset')} "
+              f"duration={manifest.get('duration_s')} {size / 1e6:.1f}MB")
@@ -0,0 +1,116 @@
+from pathlib import Path
+import threading
+import argparse
+import json
+import os
+
+import farm
+
+# Declarative experiment sweeps.
+#
+#   sudo python3 sweep.py sweeps/example.json [--out ./log/sweeps/example]
+#
+# The config lists the values of each dimension; the sweep runs every
+# combination (trace x offset x algorithm x handover model x loss rates x
+# repetition) as a farm cell. Repetition r uses seed `seed + r`. An algorithm
+# may name its own server binary in "servers" (default: "server", then the
+# unmodified picoquicdemo).
+#
+# Every cell that completes is appended to <out>/manifest.jsonl; running the
+# same sweep again skips the cells already there, so an interrupted sweep
+# resumes where it stopped. Failed cells are not recorded and are retried.
+
+DEFAULTS = {
+    "traces": ["./victoria.csv"],
+    "offsets": [0],
+    "algorithms": ["bbr"],
+    "servers": {},
+    "server": None,
+    "handover_models": ["step"],
+    "loss_rates": [[2, 3]],
+    "repetitions": 1,
+    "seed": 0,
+    "file": "data4.bin",
+    "jobs": 2,
+    "cores_per_run": 1,
+    "timeout": None,
+    # Per-run watchdog (see run_watchdog.py); None keeps its defaults
+    "deadline_s": None,
+    "stall_s": None,
+}
+
+def load_config(path):
+    with open(path) as f:
+        config = json.load(f)
+    unknown = set(config) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown sweep settings {sorted(unknown)}, expected some of {sorted(DEFAULTS)}")
+    return {**DEFAULTS, **config}
+
+def expand(config):
+    """Every cell of the sweep's matrix, in a stable order."""
+    seeds = [config["seed"] + r for r in range(config["repetitions"])]
+    cells = []
+    for algo in config["algorithms"]:
+        server = config["servers"].get(algo, config["server"])
+        cells += farm.make_cells(config["traces"], config["offsets"], [algo], seeds, server,
+                                 config["handover_models"], config["loss_rates"], config["file"])
+    for key in ("deadline_s", "stall_s"):
+        if config[key] is not None:
+            for cell in cells: cell[key] = config[key]
+    return cells
+
+class Manifest:
+    """Append-only record of completed cells, one JSON object per line."""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = {}
+        if os.path.isfile(path):
+            with open(path) as f:
+                for line in f:
+                    # An interrupted write leaves at most one partial last line
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.done[entry["id"]] = entry
+
+    def add(self, result):
+        if not result["ok"]: return
+        with self.lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(result) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.done[result["id"]] = result
+
+def run_sweep(config, out_dir):
+    os.makedirs(out_dir, exist_ok = True)
+    with open(os.path.join(out_dir, "config.json"), "w") as f:
+        json.dump(config, f, indent = 1)
+
+    manifest = Manifest(os.path.join(out_dir, "manifest.jsonl"))
+    cells = expand(config)
+    pending = [cell for cell in cells if farm.cell_id(cell) not in manifest.done]
+    print(f"{len(cells)} cells, {len(cells) - len(pending)} already done")
+
+    farm.run_farm(pending, config["jobs"], config["cores_per_run"], out_dir, config["timeout"], on_result = manifest.add)
+    print(f"{sum(farm.cell_id(cell) in manifest.done for cell in cells)}/{len(cells)} cells done")
+    return manifest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Run (or resume) an experiment sweep.")
+    parser.add_argument("config")
+    parser.add_argument("--out", default = None, help = "default: ./log/sweeps/<config name>")
+    parser.add_argument("--list", action = "store_true", help = "only list the cells and whether they are done")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    out_dir = args.out or os.path.join("./log/sweeps", Path(args.config).stem)
+    if args.list:
+        manifest = Manifest(os.path.join(out_dir, "manifest.jsonl"))
+        for cell in expand(config):
+            print(f"{'done' if farm.cell_id(cell) in manifest.done else '    '} {farm.cell_id(cell)}")
+    else:
+        run_sweep(config, out_dir)
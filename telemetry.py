@@ -0,0 +1,184 @@
+import subprocess
+import threading
+import json
+import time
+import re
+import os
+
+import numpy as np
+
+from instrument import LagBuffer
+
+# Link telemetry sampled from inside the hosts' namespaces.
+#
+# Every interval (default 10 ms) the sampler records, for each watched
+# interface, its rx/tx byte, packet and drop counters and the totals of its
+# qdiscs' `tc -s` statistics (sent, drops, overlimits, backlog). The counters
+# come from /proc/<host shell pid>/net/dev, which shows the same numbers as
+# /sys/class/net/*/statistics but for the host's own namespace (sysfs shows
+# the namespace it was mounted in), and is read without starting a process.
+# qdisc statistics come from one long-lived `tc -s -batch -` per host.
+#
+# Samples are fixed-size records (sample_dtype(), one block of fields per
+# interface) appended to <path>; <path minus .bin>.json names the interfaces
+# and the interval. load_telemetry() maps the file back as a record array.
+#
+#   python3 telemetry.py log/runs/<run>/telemetry.bin   # summary per interface
+
+DEFAULT_INTERVAL_S = 0.01
+DEFAULT_LINKS = {"r2": ["r2-eth0", "r2-eth1"], "h2": ["h2-eth0"]}
+
+DEV_FIELDS = ("rx_bytes", "rx_packets", "rx_drop", "tx_bytes", "tx_packets", "tx_drop")
+QDISC_FIELDS = ("sent_bytes", "sent_packets", "qdisc_drops", "overlimits", "backlog_bytes", "backlog_packets")
+
+# Rows buffered in memory between writes
+FLUSH_ROWS = 100
+
+def sample_dtype(devs):
+    fields = [("realtime_ns", "<i8"), ("monotonic_ns", "<i8")]
+    for dev in devs:
+        fields += [(f"{dev}:{name}", "<u8") for name in DEV_FIELDS + QDISC_FIELDS]
+    return np.dtype(fields)
+
+def read_net_dev(pid):
+    """{interface: (rx bytes, rx packets, rx drop, tx bytes, tx packets, tx drop)} of pid's namespace."""
+    counters = {}
+    with open(f"/proc/{pid}/net/dev") as f:
+        for line in f.readlines()[2:]:
+            name, _, values = line.partition(":")
+            v = values.split()
+            counters[name.strip()] = (int(v[0]), int(v[1]), int(v[3]), int(v[8]), int(v[9]), int(v[11]))
+    return counters
+
+SIZE_UNITS = {"b": 1, "Kb": 1024, "Mb": 1024 ** 2, "Gb": 1024 ** 3}
+SENT = re.compile(r"Sent (\d+) bytes (\d+) pkt \(dropped (\d+), overlimits (\d+)")
+BACKLOG = re.compile(r"backlog ([\d.]+)([KMG]?b) (\d+)p")
+
+def parse_qdisc_stats(lines):
+    """Totals over the qdiscs in `tc -s qdisc show dev X` output, in QDISC_FIELDS order."""
+    totals = [0] * len(QDISC_FIELDS)
+    for line in lines:
+        match = SENT.search(line)
+        if match:
+            for i, value in enumerate(match.groups()): totals[i] += int(value)
+            continue
+        match = BACKLOG.search(line)
+        if match:
+            totals[4] += int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+            totals[5] += int(match.group(3))
+    return totals
+
+class QdiscStats:
+    """`tc -s qdisc show` through one long-lived tc batch process on a host."""
+
+    # A show of a missing device makes tc print this name in an error line,
+    # which marks the end of the previous command's output (stderr is merged).
+    BARRIER_DEV = "telemetry-end"
+
+    def __init__(self, host):
+        self.host = host
+        self.proc = host.popen(["tc", "-s", "-force", "-batch", "-"],
+                               stdin = subprocess.PIPE, stdout = subprocess.PIPE, stderr = subprocess.STDOUT,
+                               universal_newlines = True, bufsize = 1)
+
+    def read(self, devs):
+        self.proc.stdin.write("".join(f"qdisc show dev {dev}\nqdisc show dev {self.BARRIER_DEV}\n" for dev in devs))
+        self.proc.stdin.flush()
+        stats = {}
+        for dev in devs:
+            lines = []
+            while True:
+                line = self.proc.stdout.readline()
+                if not line:
+                    raise RuntimeError(f"tc batch process on {self.host.name} exited")
+                if self.BARRIER_DEV in line:
+                    # followed by tc's "Command failed -:N"
+                    self.proc.stdout.readline()
+                    break
+                lines.append(line)
+            stats[dev] = parse_qdisc_stats(lines)
+        return stats
+
+    def close(self):
+        if self.proc.poll() is None:
+            self.proc.stdin.close()
+            self.proc.wait()
+
+class TelemetrySampler(threading.Thread):
+    def __init__(self, net, path, links = DEFAULT_LINKS, interval = DEFAULT_INTERVAL_S):
+        super().__init__(daemon = True)
+        self.hosts = [(net.get(name), devs) for name, devs in links.items()]
+        self.devs = [dev for _, devs in self.hosts for dev in devs]
+        self.dtype = sample_dtype(self.devs)
+        self.interval = interval
+        self.path = path
+        self.stop_event = threading.Event()
+        self.lags = LagBuffer()
+        self.n_samples = 0
+
+        with open(meta_path(path), "w") as f:
+            json.dump({"interval": interval, "devs": self.devs, "dev_fields": DEV_FIELDS, "qdisc_fields": QDISC_FIELDS}, f)
+        self.file = open(path, "wb")
+        self.qdisc_stats = [QdiscStats(host) for host, _ in self.hosts]
+
+    def sample(self, row):
+        row["realtime_ns"] = time.time_ns()
+        row["monotonic_ns"] = time.monotonic_ns()
+        for (host, devs), qdisc_stats in zip(self.hosts, self.qdisc_stats):
+            counters = read_net_dev(host.pid)
+            stats = qdisc_stats.read(devs)
+            for dev in devs:
+                for name, value in zip(DEV_FIELDS, counters.get(dev, (0,) * len(DEV_FIELDS))): row[f"{dev}:{name}"] = value
+                for name, value in zip(QDISC_FIELDS, stats[dev]): row[f"{dev}:{name}"] = value
+
+    def run(self):
+        buffer = np.zeros(FLUSH_ROWS, dtype = self.dtype)
+        n = 0
+        start = time.monotonic()
+        tick = 0
+        # Absolute deadlines, as in ReplayClock: a slow sample doesn't shift later ones
+        while not self.stop_event.wait(max(0.0, start + tick * self.interval - time.monotonic())):
+            self.lags.append(time.monotonic() - (start + tick * self.interval))
+            self.sample(buffer[n])
+            n += 1
+            if n == FLUSH_ROWS:
+                self.file.write(buffer.tobytes())
+                n = 0
+            # Skip deadlines already missed instead of sampling back to back
+            tick = max(tick + 1, int((time.monotonic() - start) // self.interval) + 1)
+            self.n_samples += 1
+        self.file.write(buffer[:n].tobytes())
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+        self.file.close()
+        for qdisc_stats in self.qdisc_stats: qdisc_stats.close()
+        summary = self.lags.summary()
+        return {"samples": self.n_samples, "lag_p99_ms": float(summary[3]) if summary else None}
+
+def meta_path(path): return f"{os.path.splitext(path)[0]}.json"
+
+def load_telemetry(path):
+    """(record array of samples, metadata) of a telemetry file."""
+    with open(meta_path(path)) as f:
+        meta = json.load(f)
+    dtype = sample_dtype(meta["devs"])
+    count = os.path.getsize(path) // dtype.itemsize
+    if count == 0: return np.zeros(0, dtype = dtype), meta
+    return np.memmap(path, dtype = dtype, mode = "r", shape = (count,)), meta
+
+if __name__ == "__main__":
+    import sys
+    samples, meta = load_telemetry(sys.argv[1])
+    if len(samples) < 2:
+        print(f"{len(samples)} samples")
+        sys.exit(0)
+    seconds = (samples["monotonic_ns"][-1] - samples["monotonic_ns"][0]) / 1e9
+    gaps = np.diff(samples["monotonic_ns"]) / 1e6
+    print(f"{len(samples)} samples over {seconds:.2f}s, interval p50={np.median(gaps):.2f}ms max={gaps.max():.2f}ms")
+    for dev in meta["devs"]:
+        def delta(name): return int(samples[f"{dev}:{name}"][-1]) - int(samples[f"{dev}:{name}"][0])
+        print(f"{dev}: rx {delta('rx_bytes') * 8 / seconds / 1e6:.2f}Mbit/s tx {delta('tx_bytes') * 8 / seconds / 1e6:.2f}Mbit/s "
+              f"qdisc drops {delta('qdisc_drops')} overlimits {delta('overlimits')} "
+              f"backlog max {int(samples[f'{dev}:backlog_bytes'].max())}B")
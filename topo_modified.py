@@ -1,12 +1,12 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 from multiprocessing import Process
 from mininet.cli import CLI
 import numpy as np
 import threading
 import random
 import time
-import math
-import csv
+import argparse
+import os
 import re
 
 from mininet.log import setLogLevel
@@ -14,149 +14,141 @@ from mininet.net import Mininet
 from mininet.link import TCLink
 import mininet.node
 
-class NetworkConfigThread(threading.Thread):
-    def __init__(self, net, host_name, dev, trace_path, step, column, line_number = 0, lock=None):
-        super().__init__()
-        self.net = net
-        self.host = net.get(host_name)
-        self.dev = dev
-        self.step = step
-        self.column = column
-        self.stop_event = threading.Event()
-
-        self.trace_path = trace_path
-
-        self.current_line_number = line_number
-
-        self.lock = lock
-
-    def stop(self): self.stop_event.set()
-
-    def join(self):
-        threading.Thread.join(self)
-        return self.current_line_number
-
-    def set_bandwidth(self, bw, action = "change"):
-        burst = int(math.ceil(bw))
-        with self.lock:
-            self.host.cmd(f'tc qdisc {action} dev {self.dev} root handle 1: tbf rate {bw}mbit burst 200k latency 50ms')
-
-    def set_delay(self, delay, action = "change"):
-        with self.lock:
-            self.host.cmd(f'tc qdisc {action} dev {self.dev} parent 1:1 handle 10: netem delay {delay}ms')
-
-    def get_bandwidth(self, lines): return float(lines[self.current_line_number][self.column - 2])
-
-    def get_delay(self, lines): return float(lines[self.current_line_number][self.column])
-
-    def run(self):
-        with open(self.trace_path, 'r') as file:
-            lines = list(csv.reader(file))
-
-        # Initial bandwidth and delay
-        self.set_bandwidth(self.get_bandwidth(lines), action = "replace")
-        self.set_delay(self.get_delay(lines), action = "add")
-        
-        while not self.stop_event.is_set():
-
-            # Current bandwith and delay
-            self.set_delay(self.get_delay(lines))
-            self.set_bandwidth(self.get_bandwidth(lines))
-            
-            self.current_line_number += 1
-            self.current_line_number %= len(lines)
-            
-            time.sleep(self.step)
-
-def link_interruption(node: mininet.node.Host, link: str, loss_rate: int, r2_lock:threading.Lock, r4_lock:threading.Lock):
+from qdisc import get_shaper, shaper_summaries, close_backends
+from link_trace import load_schedule
+from replay import ReplayClock
+from link_engine import LinkEngine
+from instrument import InstrumentedLock
+import instrument
+import eventlog
+from handover import (HANDOVER_OFFSETS_S, HANDOVER_MODELS, HANDOVER_LOSS_RATES, HANDOVER_OUTAGE_S, PRECISE_WAIT_S,
+                      HandoverSchedule, OutageInjector, sleep_until)
+from trace_catalog import TraceCatalog
+from topo_spec import TOPOLOGY, configure_nodes
+import runs
+import readiness
+from capture import Capture
+from telemetry import TelemetrySampler
+from hostlog import OutputStream
+from run_watchdog import RUN_DEADLINE_S, STALL_S, RunWatchdog, transfer_progress
+
+handover_schedule = HandoverSchedule(HANDOVER_OFFSETS_S)
+
+def sleep_until_ts(end): return sleep_until(end)
+
+def next_handover_ts(): return handover_schedule.next_after()
+
+def add_trace_link(engine, net, host_name, dev, trace_path, column, lock, backend = "batch",
+                   trace_step = 0.1, method = "hold", bw_tolerance = 0.0, delay_tolerance = 0.0):
+    # Delay in column, bandwidth in column - 2 (the trace CSV's layout, as in topo_base.py).
+    # The trace (one row per trace_step s) is resampled to the engine's step as it is replayed.
+    # Updates within the tolerances (Mbit/s, ms) of the applied values are skipped (see LinkShaper).
+    shaper = get_shaper(net.get(host_name), dev, lock, backend, bw_tolerance, delay_tolerance)
+    schedule = load_schedule(trace_path, trace_step, engine.clock.step, method)
+    return engine.add_link(shaper, schedule, column - 2, column)
+
+def outage_injector(node: mininet.node.Host, link: str, r2_lock, r4_lock):
+    # Both ends' locks, always taken in node name order
     for intf in node.intfList():
         if intf.link and str(intf) == link:
             intfs = [intf.link.intf1, intf.link.intf2]
-
-            lock1, lock2 = (r2_lock, r4_lock) if intfs[0].node.name < intfs[1].node.name else (r4_lock, r2_lock)
-            with lock1:
-                with lock2:
-                    print(f"Configuring loss={loss_rate}% on {intfs[0]} and {intfs[1]}")
-                    intfs[0].config(loss = loss_rate)
-                    intfs[1].config(loss = loss_rate)
-            return
-
-def sleep_until_ts(end):
-    while True:
-        now = time.time()
-        diff = end - now
-
-        if diff <= 0.0: break
-        else: time.sleep(diff / 2.0)
-
-def next_handover_ts():
-    now = datetime.fromtimestamp(time.time())
-    current_minute = now - timedelta(seconds = now.second, microseconds = now.microsecond)
-    next_minute    = current_minute + timedelta(minutes = 1) # 修正
-
-    handovers = list(map(lambda x: timedelta(seconds = x), [12, 27, 42, 57]))
-
-    for minute in [current_minute, next_minute]:
-        for offset in handovers:
-            candidate = minute + offset
-            if now < candidate:
-                return candidate.timestamp() 
-
-    raise Exception("Could not calculate next handover.")
-
-def handover_event(node: mininet.node.Host, trace_path, r2_lock, r4_lock):
-    network_thread2 = NetworkConfigThread(net, 'r2', 'r2-eth1', trace_path, 0.1, 3, lock=r2_lock)
-    network_thread4 = NetworkConfigThread(net, 'r4', 'r4-eth0', trace_path, 0.1, 2, lock=r4_lock)
-    
-    # TODO: wait until start of an interval
-
-    network_thread2.start()
-    network_thread4.start()
-
-    while True:
-        sleep_until_ts(next_handover_ts())
-
-        stop_event = threading.Event()
-        network_thread2.stop()
-        network_thread4.stop()
-        line2 = network_thread2.join()
-        line4 = network_thread4.join()
-
-        print("Handover event at", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-
-        #対処中の部分
-        loss_rate = random.choice([2, 3])
-        iface1 = "r2-eth0"
-        link_interruption(node, iface1, loss_rate, r2_lock, r4_lock) # iface1 = "r2-eth0"
-
-        network_thread2 = NetworkConfigThread(net, 'r2', 'r2-eth1', trace_path, 0.1, 3, line2, lock=r2_lock)
-        network_thread4 = NetworkConfigThread(net, 'r4', 'r4-eth0', trace_path, 0.1, 2, line4, lock=r4_lock)
-        network_thread2.start()
-        network_thread4.start()
-
-def run_test(net, server_command, client_command):
+            locks = (r2_lock, r4_lock) if intfs[0].node.name < intfs[1].node.name else (r4_lock, r2_lock)
+            return OutageInjector(intf, locks).install()
+
+    raise Exception(f"Could not find link {link} on {node.name}.")
+
+def handover_event(injector: OutageInjector, ts, loss_rates = HANDOVER_LOSS_RATES):
+    print("Handover event at", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+    #対処中の部分
+    loss_rate = random.choice(loss_rates)
+    print(f"Configuring loss={loss_rate}% on {injector.intfs[0]} and {injector.intfs[1]}")
+    # Records when the loss took effect against ts, for the outage window
+    injector.begin(loss_rate, ts) # iface1 = "r2-eth0"
+
+def end_outage(injector: OutageInjector, duration_s = HANDOVER_OUTAGE_S):
+    window = injector.end(duration_s)
+    if window is not None:
+        print(f"Outage window {window * 1e3:.1f}ms (requested {duration_s * 1e3:.0f}ms)")
+
+def schedule_handovers(engine, injector: OutageInjector, model = "step", loss_rates = HANDOVER_LOSS_RATES):
+    # Handovers run on the engine's timeline; each one schedules the next. The
+    # engine wakes PRECISE_WAIT_S early and the schedule waits out the rest.
+    # See handover.HANDOVER_MODELS for the models.
+    if model not in HANDOVER_MODELS:
+        raise ValueError(f"Unknown handover model {model!r}, expected one of {HANDOVER_MODELS}")
+    if model == "none": return
+
+    def arm():
+        ts = handover_schedule.next_after()
+        engine.schedule_at_ts(ts - PRECISE_WAIT_S, lambda: fire(ts))
+
+    def fire(ts):
+        # Re-armed even if this one fails (the engine reports the failure)
+        try:
+            handover_schedule.wait(ts)
+            handover_event(injector, ts, loss_rates)
+            if model == "outage":
+                engine.schedule_at_ts(ts + HANDOVER_OUTAGE_S, lambda: end_outage(injector))
+        finally:
+            arm()
+
+    arm()
+
+def print_event(host, name, line): print(f"{host.name}: {line}")
+
+def run_test(net, server_command, client_command, timings = None, output_dir = None,
+             deadline_s = RUN_DEADLINE_S, stall_s = STALL_S):
+    # timings (a dict), if given, receives how long the server took to start listening,
+    # when key output lines appeared and whether the watchdog stopped the run. With
+    # output_dir (a runs.RunDir path), each side's output is streamed to server.out /
+    # client.out there, one timestamped line at a time.
     h1 = net.get("h1")
     h2 = net.get("h2")
 
     #CLI(net) #デバッグ用
 
     h1.sendCmd(server_command)
+    server_stream = OutputStream(h1, output_dir and os.path.join(output_dir, "server.out"), print_event)
+    server_stream.start()
+    try:
+        server_ready = readiness.wait_server(h1, 4434)
+    except readiness.ProbeTimeout:
+        h1.sendInt()
+        server_stream.join()
+        print("\n".join(server_stream.tail))
+        raise
+    if timings is not None: timings["server_ready_s"] = server_ready
 
     start = time.time()
     h2.sendCmd(client_command)
-    server_out = h1.waitOutput()
+    client_stream = OutputStream(h2, output_dir and os.path.join(output_dir, "client.out"), print_event)
+    client_stream.start()
+    # Stops both sides if the transfer passes deadline_s or makes no progress for stall_s
+    qlog_dirs = [os.path.join(output_dir, side) for side in ("client", "server")] if output_dir else []
+    watchdog = RunWatchdog([h1, h2], transfer_progress(h2, "h2-eth0", qlog_dirs), deadline_s, stall_s)
+    watchdog.start()
+    server_stream.join()
     duration = time.time() - start
 
-    client_out = h2.waitOutput()
+    client_stream.join()
+    timed_out = watchdog.finish()
+    if timed_out: print(f"Run stopped by the watchdog ({timed_out})")
 
     print(f"Duration: {duration:.2f}")
 
     print ("Server#############")
-    print (server_out)
+    print ("\n".join(server_stream.tail))
     print ("Client#############")
-    print (client_out)
+    print ("\n".join(client_stream.tail))
     print ("###################")
 
+    if timings is not None:
+        timings["server_output"] = server_stream.summary()
+        timings["client_output"] = client_stream.summary()
+        timings["timed_out"] = timed_out
+    return duration
+
     # for line in client_out.split("\n"):
     #     if line.startswith("Connection established."): print(line)
 
@@ -174,8 +166,31 @@ def run_test(net, server_command, client_command):
     #     h2.waitOutput()
     #     time.sleep(5)
 
+PICOQUICDEMO = "../picoquic_leo/build/picoquicdemo"
+
+def picoquic_commands(test_algo, test_server = PICOQUICDEMO, client_algo = "bbr", request_file = "data4.bin",
+                      server_qlog_dir = "./log/server/slogs", server_log_path = "/tmp/server.log",
+                      client_qlog_dir = "./log/client/picoquic_leo/slogs", client_out_dir = "./log/client/picoquic_leo/out"):
+    # Pass **runs.RunDir.picoquic_paths() to give the run its own output directory
+    server_command = f"{test_server} -l {server_log_path} -c ./auth/cert.pem -k ./auth/key.pem -1 -p 4434 -G {test_algo} -q {server_qlog_dir} -w ./log/server/srv"
+    client_command = f"{PICOQUICDEMO} -n eidetic -e 3 -T /dev/null -G {client_algo} -q {client_qlog_dir} -o {client_out_dir} 10.0.1.2 4434 '{request_file}'"
+    return server_command, client_command
+
+def start_link_engine(net, r2_lock, r4_lock, trace_path, trace_step = 0.1, control_step = 0.1, method = "hold",
+                      handover_model = "step", loss_rates = HANDOVER_LOSS_RATES, bw_tolerance = 0.0, delay_tolerance = 0.0):
+    # r2-eth1 / r4-eth0 follow the trace; handovers hit r2-eth0
+    engine = LinkEngine(ReplayClock(control_step))
+    tolerances = {"bw_tolerance": bw_tolerance, "delay_tolerance": delay_tolerance}
+    add_trace_link(engine, net, 'r2', 'r2-eth1', trace_path, 3, r2_lock, trace_step = trace_step, method = method, **tolerances)
+    add_trace_link(engine, net, 'r4', 'r4-eth0', trace_path, 2, r4_lock, trace_step = trace_step, method = method, **tolerances)
+    injector = outage_injector(net.get("r2"), "r2-eth0", r2_lock, r4_lock)
+    schedule_handovers(engine, injector, handover_model, loss_rates)
+    engine.start()
+    return engine, injector
+
 def create_topology():
     setLogLevel('info')
+    start = time.perf_counter()
     net = Mininet(link=TCLink)
 
     h1 = net.addHost('h1') # Server
@@ -194,136 +209,144 @@ def create_topology():
     net.addLink(r4, r2, cls=TCLink, **linkopt_server)
     net.addLink(r2, h2, cls=TCLink, **linkopt_starlink)
     net.build()
+    built = time.perf_counter()
 
-    r1.cmd("ifconfig r1-eth0 0")
-    r1.cmd("ifconfig r1-eth1 0")
-
-    r1.cmd("echo 1 > /proc/sys/net/ipv4/ip_forward")
-    r1.cmd("echo 1 > /proc/sys/net/ipv4/conf/all/proxy_arp")
-
-    r1.cmd("ifconfig r1-eth0 10.0.1.1 netmask 255.255.255.0")
-    r1.cmd("ifconfig r1-eth1 10.0.2.1 netmask 255.255.255.0")
-    
-    r4.cmd("ifconfig r4-eth0 0")
-    r4.cmd("ifconfig r4-eth1 0")
-
-    r4.cmd("echo 1 > /proc/sys/net/ipv4/ip_forward")
-    r4.cmd("echo 1 > /proc/sys/net/ipv4/conf/all/proxy_arp")
-
-    r4.cmd("ifconfig r4-eth0 10.0.2.4 netmask 255.255.255.0")
-    r4.cmd("ifconfig r4-eth1 10.0.6.4 netmask 255.255.255.0")
-    
-    r2.cmd("ifconfig r2-eth0 0")
-    r2.cmd("ifconfig r2-eth1 0")
-
-    r2.cmd("echo 1 > /proc/sys/net/ipv4/ip_forward")
-    r2.cmd("echo 1 > /proc/sys/net/ipv4/conf/all/proxy_arp")
-
-    r2.cmd("ifconfig r2-eth0 10.0.6.2 netmask 255.255.255.0")
-    r2.cmd("ifconfig r2-eth1 10.0.4.2 netmask 255.255.255.0")
-    
-    r2.cmd("ip route add 10.0.1.0/24 via 10.0.6.4")
-    
-    r1.cmd("ip route add 10.0.4.0/24 via 10.0.2.4")
-    
-    r4.cmd("ip route add 10.0.1.0/24 via 10.0.2.1")
-    r4.cmd("ip route add 10.0.4.0/24 via 10.0.6.2")
-
-    h1.cmd("ifconfig h1-eth0 0")
+    # Addresses, routes and forwarding: one batched command per node, nodes in parallel (see topo_spec.py)
+    configure_nodes(net, TOPOLOGY)
+    configured = time.perf_counter()
 
-    h2.cmd("ifconfig h2-eth0 0")
-
-    h1.cmd("ifconfig h1-eth0 10.0.1.2 netmask 255.255.255.0")
-
-    h2.cmd("ifconfig h2-eth0 10.0.4.3 netmask 255.255.255.0")
-
-    h1.cmd("ip route add default scope global nexthop via 10.0.1.1 dev h1-eth0")
-
-    h2.cmd("ip rule add from 10.0.4.3 table 1")
-    
-    h2.cmd("ip route add 10.0.6.0/24 dev h2-eth0 table 1")
-    h2.cmd("ip route add 10.0.4.0/24 dev h2-eth0 table 1")
-    h2.cmd("ip route add 10.0.2.0/24 dev h2-eth0 table 1")
-    h2.cmd("ip route add 10.0.1.0/24 dev h2-eth0 table 1")
-    
-    h2.cmd("ip route add default scope global nexthop via 10.0.4.2 dev h2-eth0")
-
-    h1.cmd('xterm -title "node: h2 monitoring" -hold -e "sudo bwm-ng" &')
-    time.sleep(1)
+    print(f"Topology up in {configured - start:.3f}s (build {built - start:.3f}s, configure {configured - built:.3f}s)")
+    net.startup_times = {"build": built - start, "configure": configured - built}
 
     return net
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Run the StarQUIC tests over the trace-driven topology.")
+    parser.add_argument("--no-instrument", dest = "instrument", action = "store_false",
+                        help = "don't record control-plane latencies (latency.json per run)")
+    args = parser.parse_args()
 
+    # Link throughput/queues are recorded per run by telemetry.py (replaces the bwm-ng xterm)
     net = create_topology()
+    eventlog.open_log()
 
     #change_latency_process = Process(target = handover_event, args = (net.get("r2"), '../Starlink-Emulator/victoria.csv',))
     #change_latency_process.start()
 
-    r2_lock = threading.Lock()
-    r4_lock = threading.Lock()
-
-    change_latency_thread = threading.Thread(
-        target = handover_event, 
-        args = (net.get("r2"), './victoria.csv', r2_lock, r4_lock)
-        )
-    change_latency_thread.daemon = True
-    change_latency_thread.start()
+    # Record lock waits / tc apply / loss config latencies into a per-run report
+    if args.instrument:
+        instrument.enable()
+        r2_lock = InstrumentedLock("r2")
+        r4_lock = InstrumentedLock("r4")
+    else:
+        r2_lock = threading.Lock()
+        r4_lock = threading.Lock()
+
+    trace_path = './victoria.csv' # or a compiled/synthetic .trace.npy (see trace_gen.py)
+    trace_step = 0.1    # seconds per trace row
+    control_step = 0.1  # seconds per shaper update
+    resample_method = "hold"
+    bw_tolerance = 0.0    # Mbit/s; smaller bandwidth changes are not applied
+    delay_tolerance = 0.0 # ms; likewise for delay
+    offset = 0          # trace rows
+
+    # Pick offsets by segment behaviour instead, e.g. {"delay_p95": (60, None), "bw_min": (None, 20)}
+    # (see trace_catalog.py for the available stats); run i replays the i-th match.
+    segment_query = None
+    if segment_query:
+        catalog = TraceCatalog.load_or_build(os.path.dirname(trace_path) or ".", column = 3, step = trace_step)
+        offsets = [o for _, o in catalog.query(trace = trace_path, **segment_query)]
+        if not offsets: raise Exception(f"No segment of {trace_path} matches {segment_query}.")
+        print(f"{len(offsets)} trace offsets match {segment_query}")
+    else:
+        offsets = [offset]
+
+    engine, injector = start_link_engine(net, r2_lock, r4_lock, trace_path, trace_step, control_step, resample_method,
+                                         bw_tolerance = bw_tolerance, delay_tolerance = delay_tolerance)
 
-    trace_path = './victoria.csv'
-    offset = 0
     n_tests = 10
 
     test_algo = "bbr"
     #test_server = "./build/picoquicdemo" # Modified
-    test_server = "../picoquic_leo/build/picoquicdemo" # Unmodified
+    test_server = PICOQUICDEMO # Unmodified
 
-    server_log_path = "/tmp/server.log"
-    server_command = f"{test_server} -l {server_log_path} -c ./auth/cert.pem -k ./auth/key.pem -1 -p 4434 -G {test_algo} -q ./log/server/slogs -w ./log/server/srv"
-    client_command = "../picoquic_leo/build/picoquicdemo -n eidetic -e 3 -T /dev/null -G bbr -q ./log/client/picoquic_leo/slogs -o ./log/client/picoquic_leo/out 10.0.1.2 4434 'data4.bin'"
-
-    print("Server command:", server_command)
-    print("Client command:", client_command)
+    capture_mode = "headers" # "full", "headers" or "rotating" (see capture.py)
 
     def run_tests():
         for i in range(n_tests):
+            # Each run writes its qlogs, server log and pcap into its own directory (see runs.py)
+            run = runs.new_run(label = f"{i}_{test_algo}")
+            server_command, client_command = picoquic_commands(test_algo, test_server, **run.picoquic_paths())
+            print("Server command:", server_command)
+            print("Client command:", client_command)
 
             h2 = net.get("h2")
-            dump_file = f"./log/tcpdump/client_{i}.pcap"
-            h2.cmd(f"rm -f {dump_file}")
-            h2.cmd(f"tcpdump -i h2-eth0 -w {dump_file} &")
-            time.sleep(1)
-
-            #network_thread2 = NetworkConfigThread(net, 'r2', 'r2-eth1', trace_path, 0.1, 3, offset)
-            #network_thread4 = NetworkConfigThread(net, 'r4', 'r4-eth0', trace_path, 0.1, 2, offset)
+            capture = Capture(h2, "h2-eth0", run.pcap, capture_mode)
+            timings = {}
+            try:
+                timings["capture_ready_s"] = capture.start()
+            except readiness.ProbeTimeout as e:
+                # Record the failed start and carry on with the next run
+                print(f"Test {i}: {e}")
+                timings["error"] = str(e)
 
-            network_thread2 = NetworkConfigThread(net, 'r2', 'r2-eth1', trace_path, 0.1, 3, offset, lock=r2_lock)
-            network_thread4 = NetworkConfigThread(net, 'r4', 'r4-eth0', trace_path, 0.1, 2, offset, lock=r4_lock)
-            
             print(f"Test {i}: Waiting for initial handover... ")
-            sleep_until_ts(next_handover_ts())
-            print("Start.")
-
-            network_thread2.start()
-            network_thread4.start()
-
-            run_test(net, server_command, client_command)
-
-            network_thread2.stop()
-            network_thread4.stop()
-            network_thread2.join()
-            network_thread4.join()
-
-            h2.cmd("pkill tcpdump")
-            time.sleep(1)
+            late = sleep_until_ts(next_handover_ts())
+            print(f"Start ({late * 1e3:+.3f}ms).")
+
+            # Restart the trace at offset on the shared timeline
+            offset = offsets[i % len(offsets)]
+            try:
+                engine.seek(int(round(offset * trace_step / control_step)))
+            except RuntimeError as e:
+                # The engine is gone: the link would not follow the trace
+                print(f"Test {i}: {e}")
+                timings["error"] = str(e)
+            eventlog.log(eventlog.RUN_START, i, offset, flush = True)
+            first_tick = len(engine.clock.lags)
+            first_error = engine.n_errors
+            if instrument.recorder(): instrument.recorder().reset()
+
+            sampler = TelemetrySampler(net, os.path.join(run.path, "telemetry.bin"))
+            sampler.start()
+            start = time.time()
+            duration = None
+            if "error" not in timings:
+                try:
+                    duration = run_test(net, server_command, client_command, timings, run.path)
+                except readiness.ProbeTimeout as e:
+                    print(f"Test {i}: {e}")
+                    timings["error"] = str(e)
+            end = time.time()
+            eventlog.log(eventlog.RUN_END, i, flush = True)
+            telemetry = sampler.stop()
+
+            print(f"Test {i}: tick lag {engine.clock.lag_summary(first_tick)}")
+            timings["engine"] = engine.health(first_error)
+            if instrument.recorder(): instrument.recorder().write_report(os.path.join(run.path, "latency.json"))
+
+            try:
+                timings["pcap_flush_s"] = capture.stop()
+            except readiness.ProbeTimeout as e:
+                timings["pcap_error"] = str(e)
+            print(f"Test {i}: start-up {timings}")
+            run.finish(run = i, algo = test_algo, server = test_server, trace = trace_path, offset = offset,
+                       start = start, end = end, duration_s = duration, start_late_s = late, telemetry = telemetry, **timings)
 
-  
     test_process = threading.Thread(target = run_tests)
     test_process.start()
     test_process.join()
 
     net.get("h1").terminate()
     net.get("h2").terminate()
+    engine.stop()
+    engine.join()
+    print(f"Link engine tick lag {engine.clock.lag_summary()}, {engine.n_errors} failures")
+    print(f"Handover fire lag {handover_schedule.lag_summary()}")
+    print(f"Outage windows {injector.summary()}")
+    for summary in shaper_summaries(): print("Shaper", summary)
     #change_latency_process.join()
     #change_latency_thread.join()
+    close_backends()
+    eventlog.close_log()
     net.stop()
\ No newline at end of file
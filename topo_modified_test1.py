@@ -13,11 +13,18 @@ import re
 from mininet.log import setLogLevel
 from mininet.net import Mininet
 from mininet.link import TCLink
-import mininet.node
 
-import glob
 import os
-import shutil
+
+from handover import OutageInjector
+from qdisc import close_backends
+# 実行本体 (サーバー起動待ち・出力の記録・ウォッチドッグ) は topo_modified と共通
+from topo_modified import run_test
+import eventlog
+import runs
+import readiness
+from capture import Capture
+from telemetry import TelemetrySampler
 
 # NetworkConfigThreadクラスは変更なし
 class NetworkConfigThread(threading.Thread):
@@ -60,22 +67,11 @@ class NetworkConfigThread(threading.Thread):
         while not self.stop_event.is_set():
             self.set_delay(self.get_delay(lines))
             self.set_bandwidth(self.get_bandwidth(lines))
+            eventlog.log(eventlog.TC_UPDATE, self.get_bandwidth(lines), self.get_delay(lines), link = self.dev)
             self.current_line_number += 1
             self.current_line_number %= len(lines)
             time.sleep(self.step)
 
-def link_interruption(node: mininet.node.Host, link: str, loss_rate: int, r2_lock:threading.Lock, r4_lock:threading.Lock):
-    for intf in node.intfList():
-        if intf.link and str(intf) == link:
-            intfs = [intf.link.intf1, intf.link.intf2]
-            lock1, lock2 = (r2_lock, r4_lock) if intfs[0].node.name < intfs[1].node.name else (r4_lock, r2_lock)
-            with lock1:
-                with lock2:
-                    print(f"Configuring loss={loss_rate}% on {intfs[0]} and {intfs[1]}")
-                    intfs[0].config(loss = loss_rate)
-                    intfs[1].config(loss = loss_rate)
-            return
-
 def sleep_until_ts(end):
     while True:
         now = time.time()
@@ -107,35 +103,22 @@ def handover_event(net: Mininet, r2_lock, r4_lock):
     # ★論文の"handover events typically last about 100 ms"という記述に合わせる
     HANDOVER_DURATION_S = 0.1 
 
+    # netemのlossだけをその場で変更する (TCLink.configのようにtcツリーを作り直さない)
+    intf = node.intf(iface_to_disrupt)
+    lock1, lock2 = (r2_lock, r4_lock) if intf.link.intf1.node.name < intf.link.intf2.node.name else (r4_lock, r2_lock)
+    injector = OutageInjector(intf, (lock1, lock2)).install()
+
     while True:
-        sleep_until_ts(next_handover_ts())
+        start = next_handover_ts()
+        sleep_until_ts(start)
         
-        # ハンドオーバー開始：パケットロスを注入
+        # ハンドオーバー開始：パケットロスを注入、期間後に0に戻す
         print(f"Handover event at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         loss_rate = random.choice([2, 3])
-        link_interruption(node, iface_to_disrupt, loss_rate, r2_lock, r4_lock)
-
-        # ハンドオーバーの期間、待機
-        time.sleep(HANDOVER_DURATION_S)
-
-        # ハンドオーバー終了：パケットロスを0に戻す
-        link_interruption(node, iface_to_disrupt, 0, r2_lock, r4_lock)
-
-# run_test と create_topology は変更なし
-def run_test(net, server_command, client_command):
-    
-    h1 = net.get("h1"); h2 = net.get("h2")
-    h1.sendCmd(server_command)
-    start = time.time()
-    h2.sendCmd(client_command)
-    server_out = h1.waitOutput()
-    duration = time.time() - start
-    client_out = h2.waitOutput()
-    print(f"Duration: {duration:.2f}")
-    print ("Server#############\n", server_out)
-    print ("Client#############\n", client_out)
-    print ("###################")
+        window = injector.outage(loss_rate, HANDOVER_DURATION_S, start)
+        print(f"Outage window {window * 1e3:.1f}ms (requested {HANDOVER_DURATION_S * 1e3:.0f}ms); {injector.summary()}")
 
+# create_topology は変更なし (run_test は topo_modified のものを使う)
 def create_topology():
     
     setLogLevel('info')
@@ -183,58 +166,67 @@ def create_topology():
     h2.cmd("ip route add 10.0.2.0/24 dev h2-eth0 table 1"); 
     h2.cmd("ip route add 10.0.1.0/24 dev h2-eth0 table 1")
     h2.cmd("ip route add default scope global nexthop via 10.0.4.2 dev h2-eth0")
-    h1.cmd('xterm -title "node: h2 monitoring" -hold -e "sudo bwm-ng" &')
-    time.sleep(1)
+    # bwm-ngのxtermの代わりに、実行ごとにtelemetry.pyでリンクの統計を記録する
     return net
 
-def run_tests(net, n_tests, test_algo):
+def run_tests(net, n_tests, test_algo, capture_mode = "headers"):
     
     print("Starting test runs in the dynamic network environment...")
     for i in range(n_tests):
         print(f"--- Starting Test {i+1}/{n_tests} ---")
+        # 実行ごとに専用の出力ディレクトリを作り、picoquicdemoの -q/-o/-l に渡す (runs.py)
+        run = runs.new_run(label = f"{i+1}_{test_algo}")
         h2 = net.get("h2")
-        dump_file = f"./log/tcpdump/client_{i}.pcap"
-        h2.cmd(f"rm -f {dump_file}")
-        h2.cmd(f"tcpdump -i h2-eth0 -w {dump_file} &")
-        time.sleep(1)
-
-        client_qlog = f"./log/client/picoquic_leo/slogs/"
-        client_out  = f"./log/client/picoquic_leo/out/"  # outは固定でもOK
+        # tcpdumpが "listening on" を出すまで待つ (固定のsleepの代わり)
+        capture = Capture(h2, "h2-eth0", run.pcap, capture_mode)
+        timings = {}
+        try:
+            timings["capture_ready_s"] = capture.start()
+        except readiness.ProbeTimeout as e:
+            # 起動失敗を記録して次の実行へ進む
+            print(f"Test {i+1}: {e}")
+            timings["error"] = str(e)
+
+        client_out = os.path.join(run.client, "out")
         client_command = (
         f"../picoquic_leo/build/picoquicdemo "
         f"-n eidetic -e 3 -T /dev/null -G {test_algo} "
-        f"-q {client_qlog} -o {client_out} 10.0.1.2 4434 'data4.bin'"
+        f"-q {run.client} -o {client_out} 10.0.1.2 4434 'data4.bin'"
         )
 
         test_server = "../picoquic_leo/build/picoquicdemo"
-        server_log_path = "/tmp/server.log"
-        server_qlog = f"./log/server/slogs/"
-        server_command = f"{test_server} -l {server_log_path} -c ./auth/cert.pem -k ./auth/key.pem -1 -p 4434 -G {test_algo} -q {server_qlog} -w ./log/server/srv"
-
-        run_test(net, server_command, client_command)
-
-        client_files = glob.glob(os.path.join(client_qlog, "*.qlog"))
-        
-        if client_files:
-            # 作成時間が最新のファイルを取得
-            src = max(client_files, key=os.path.getctime)
-            dst = os.path.join(client_qlog, f"client{i+1}.qlog")
-            shutil.move(src, dst)
-            print(f"Renamed {src} -> {dst}")
-
-        server_files = glob.glob(os.path.join(server_qlog, "*.qlog"))
-        if server_files:
-            src = max(server_files, key=os.path.getctime)
-            dst = os.path.join(server_qlog, f"server{i+1}.qlog")
-            shutil.move(src, dst)
-            print(f"Renamed {src} -> {dst}")
-
-        h2.cmd("pkill tcpdump")
-        print(f"--- Finished Test {i+1}/{n_tests} ---")
-        time.sleep(1)
+        server_log_path = os.path.join(run.server, "server.log")
+        server_command = f"{test_server} -l {server_log_path} -c ./auth/cert.pem -k ./auth/key.pem -1 -p 4434 -G {test_algo} -q {run.server} -w ./log/server/srv"
+
+        eventlog.log(eventlog.RUN_START, i, 0, flush = True)
+        sampler = TelemetrySampler(net, os.path.join(run.path, "telemetry.bin"))
+        sampler.start()
+        start = time.time()
+        duration = None
+        if "error" not in timings:
+            try:
+                duration = run_test(net, server_command, client_command, timings, run.path)
+            except readiness.ProbeTimeout as e:
+                # サーバーが起動しなかった: 記録して次の実行へ進む
+                print(f"Test {i+1}: {e}")
+                timings["error"] = str(e)
+        end = time.time()
+        eventlog.log(eventlog.RUN_END, i, flush = True)
+        telemetry = sampler.stop()
+
+        # pcapが書き出されtcpdumpが終了するまで待つ
+        try:
+            timings["pcap_flush_s"] = capture.stop()
+        except readiness.ProbeTimeout as e:
+            timings["pcap_error"] = str(e)
+        # 接続ID・条件・時刻・ファイルサイズ・起動待ち時間を manifest.json と index.jsonl に記録
+        manifest = run.finish(run = i + 1, algo = test_algo, server = test_server, offset = 0,
+                              start = start, end = end, duration_s = duration, telemetry = telemetry, **timings)
+        print(f"--- Finished Test {i+1}/{n_tests} (cid {manifest['cid']}, {run.path}) ---")
 
 if __name__ == '__main__':            
     net = create_topology()
+    eventlog.open_log()
     r2_lock = threading.Lock()
     r4_lock = threading.Lock()
     trace_path = './victoria.csv'
@@ -256,22 +248,28 @@ if __name__ == '__main__':
 
     n_tests = 10
     test_algo = "bbr"
-    run_tests(net, n_tests, test_algo)
-    print("All tests completed. Stopping network.")
-    print("All tests completed. Stopping background threads...")
-
-    # 1. バックグラウンドで動いているスレッドに停止を命令する
-    network_thread2.stop()
-    network_thread4.stop()
-    # handover_threadにはstop()がないが、daemonなので問題ない。
-    # 気になる場合は同様にEventオブジェクトを渡して停止できるようにするとより丁寧。
-
-    # 2. スレッドが完全に終了するのを待つ (join)
-    #    これにより、スレッドがネットワークリソースにアクセスしなくなることを保証する
-    network_thread2.join()
-    network_thread4.join()
-
-    print("Background threads stopped. Now stopping network.")
-
-    # 3. すべてのスレッドが停止した後で、安全にネットワークをシャットダウンする
-    net.stop()
\ No newline at end of file
+    try:
+        run_tests(net, n_tests, test_algo)
+    finally:
+        # 途中で例外が出てもネットワークを必ず停止する
+        print("All tests completed. Stopping network.")
+        print("All tests completed. Stopping background threads...")
+
+        # 1. バックグラウンドで動いているスレッドに停止を命令する
+        network_thread2.stop()
+        network_thread4.stop()
+        # handover_threadにはstop()がないが、daemonなので問題ない。
+        # 気になる場合は同様にEventオブジェクトを渡して停止できるようにするとより丁寧。
+
+        # 2. スレッドが完全に終了するのを待つ (join)
+        #    これにより、スレッドがネットワークリソースにアクセスしなくなることを保証する
+        network_thread2.join()
+        network_thread4.join()
+
+        print("Background threads stopped. Now stopping network.")
+
+        # 3. すべてのスレッドが停止した後で、安全にネットワークをシャットダウンする
+        #    (OutageInjectorが使うtc -batchのプロセスも閉じる)
+        close_backends()
+        eventlog.close_log()
+        net.stop()
\ No newline at end of file
@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+import shlex
+import time
+
+# Addresses and routes of the h1 - r1 - r4 - r2 - h2 topology.
+#
+#   h1 10.0.1.2 -- 10.0.1.1 r1 10.0.2.1 -- 10.0.2.4 r4 10.0.6.4 -- 10.0.6.2 r2 10.0.4.2 -- 10.0.4.3 h2
+#
+# Each node is configured by a single shell command: its `ip` changes are fed
+# to one `ip -batch` process and its sysctls to one `sysctl` call. Nodes are
+# configured in parallel.
+
+TOPOLOGY = {
+    "r1": {
+        "forward": True,
+        "addrs": {"r1-eth0": "10.0.1.1/24", "r1-eth1": "10.0.2.1/24"},
+        "routes": ["10.0.4.0/24 via 10.0.2.4"],
+    },
+    "r4": {
+        "forward": True,
+        "addrs": {"r4-eth0": "10.0.2.4/24", "r4-eth1": "10.0.6.4/24"},
+        "routes": ["10.0.1.0/24 via 10.0.2.1", "10.0.4.0/24 via 10.0.6.2"],
+    },
+    "r2": {
+        "forward": True,
+        "addrs": {"r2-eth0": "10.0.6.2/24", "r2-eth1": "10.0.4.2/24"},
+        "routes": ["10.0.1.0/24 via 10.0.6.4"],
+    },
+    "h1": {
+        "addrs": {"h1-eth0": "10.0.1.2/24"},
+        "routes": ["default scope global nexthop via 10.0.1.1 dev h1-eth0"],
+    },
+    "h2": {
+        "addrs": {"h2-eth0": "10.0.4.3/24"},
+        "rules": ["from 10.0.4.3 table 1"],
+        "routes": [
+            "10.0.6.0/24 dev h2-eth0 table 1",
+            "10.0.4.0/24 dev h2-eth0 table 1",
+            "10.0.2.0/24 dev h2-eth0 table 1",
+            "10.0.1.0/24 dev h2-eth0 table 1",
+            "default scope global nexthop via 10.0.4.2 dev h2-eth0",
+        ],
+    },
+}
+
+def node_script(spec):
+    """One shell line applying spec (Mininet's cmd() expects a single line)."""
+    lines = []
+    for dev, addr in spec.get("addrs", {}).items():
+        # Drop Mininet's default address, as `ifconfig dev 0` did
+        lines.append(f"addr flush dev {dev}")
+        lines.append(f"addr add {addr} brd + dev {dev}")
+        lines.append(f"link set dev {dev} up")
+    lines += [f"rule add {rule}" for rule in spec.get("rules", [])]
+    lines += [f"route add {route}" for route in spec.get("routes", [])]
+
+    script = "printf '%s\\n' " + " ".join(shlex.quote(line) for line in lines) + " | ip -force -batch -"
+    if spec.get("forward"):
+        script = "sysctl -qw net.ipv4.ip_forward=1 net.ipv4.conf.all.proxy_arp=1; " + script
+    return script
+
+def configure_nodes(net, spec = TOPOLOGY, parallel = True):
+    """Apply spec to every node; returns {node: seconds}."""
+    def configure(name):
+        start = time.perf_counter()
+        out = net.get(name).cmd(node_script(spec[name]))
+        if out.strip(): print(f"{name}: {out.strip()}")
+        return name, time.perf_counter() - start
+
+    if not parallel:
+        return dict(configure(name) for name in spec)
+    with ThreadPoolExecutor(max_workers = len(spec)) as pool:
+        return dict(pool.map(configure, spec))
@@ -0,0 +1,166 @@
+from pathlib import Path
+import argparse
+import json
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from link_trace import load_trace
+
+# Index of replay offsets by how the trace behaves after them.
+#
+# Every trace (*.csv or compiled *.trace.npy) in a directory is scanned once;
+# for windows of window_s starting every hop_s the catalog stores the delay
+# mean/p95, bandwidth min/max and change rate (changes per second) of one link
+# (delay column `column`, bandwidth column - 2, as in add_trace_link). Each stat
+# is kept sorted, so a range condition is a binary search; further conditions
+# only filter the rows that matched the first one.
+
+STATS = ("delay_mean", "delay_p95", "bw_min", "bw_max", "change_rate")
+
+def window_stats(trace, column, step, window_s, hop_s):
+    window = max(1, int(round(window_s / step)))
+    hop = max(1, int(round(hop_s / step)))
+    delay = np.asarray(trace[column], dtype = np.float64)
+    bw = np.asarray(trace[column - 2], dtype = np.float64)
+    if len(delay) < window:
+        return np.zeros(0, dtype = np.int64), {stat: np.zeros(0) for stat in STATS}
+
+    delay_w = sliding_window_view(delay, window)[::hop]
+    bw_w = sliding_window_view(bw, window)[::hop]
+
+    changed = np.zeros(len(delay), dtype = np.float64)
+    changed[1:] = (np.diff(delay) != 0) | (np.diff(bw) != 0)
+    changes = np.concatenate([[0.0], np.cumsum(changed)])
+    offsets = np.arange(len(delay_w), dtype = np.int64) * hop
+    # Changes strictly inside each window
+    n_changes = changes[offsets + window] - changes[offsets + 1]
+
+    return offsets, {
+        "delay_mean": delay_w.mean(axis = 1),
+        "delay_p95": np.percentile(delay_w, 95, axis = 1),
+        "bw_min": bw_w.min(axis = 1),
+        "bw_max": bw_w.max(axis = 1),
+        "change_rate": n_changes / (window * step),
+    }
+
+class TraceCatalog:
+    def __init__(self, traces, trace_ids, offsets, stats, params):
+        self.traces = traces
+        self.trace_ids = trace_ids
+        self.offsets = offsets
+        self.stats = stats
+        self.params = params
+        self.order = {stat: np.argsort(values, kind = "stable") for stat, values in stats.items()}
+        self.sorted = {stat: stats[stat][self.order[stat]] for stat in stats}
+
+    @staticmethod
+    def sources(directory):
+        directory = Path(directory)
+        paths = sorted(set(directory.glob("*.csv")) | set(directory.glob("*.trace.npy")))
+        # A CSV and its compiled copy are the same trace
+        csv_stems = {p.with_suffix("") for p in paths if p.suffix == ".csv"}
+        paths = [p for p in paths if p.suffix == ".csv" or Path(str(p)[:-len(".trace.npy")]) not in csv_stems]
+        return [{"path": str(p), "mtime_ns": p.stat().st_mtime_ns, "size": p.stat().st_size} for p in paths]
+
+    @classmethod
+    def build(cls, directory, column = 3, step = 0.1, window_s = 15.0, hop_s = 1.0):
+        sources = cls.sources(directory)
+        trace_ids, offsets, stats = [], [], {stat: [] for stat in STATS}
+        for i, source in enumerate(sources):
+            off, st = window_stats(load_trace(source["path"]), column, step, window_s, hop_s)
+            trace_ids.append(np.full(len(off), i, dtype = np.int32))
+            offsets.append(off)
+            for stat in STATS: stats[stat].append(st[stat])
+
+        def cat(parts, dtype): return np.concatenate(parts) if parts else np.zeros(0, dtype = dtype)
+        params = {"column": column, "step": step, "window_s": window_s, "hop_s": hop_s, "sources": sources}
+        return cls([s["path"] for s in sources], cat(trace_ids, np.int32), cat(offsets, np.int64),
+                   {stat: cat(stats[stat], np.float64) for stat in STATS}, params)
+
+    def save(self, path):
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, trace_ids = self.trace_ids, offsets = self.offsets, params = json.dumps(self.params), **self.stats)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            params = json.loads(str(data["params"]))
+            return cls([s["path"] for s in params["sources"]], data["trace_ids"], data["offsets"],
+                       {stat: data[stat] for stat in STATS}, params)
+
+    @classmethod
+    def load_or_build(cls, directory, column = 3, step = 0.1, window_s = 15.0, hop_s = 1.0, index_name = "trace_catalog.npz"):
+        """Load directory's saved catalog, rebuilding it if the traces or parameters changed."""
+        path = Path(directory) / index_name
+        wanted = {"column": column, "step": step, "window_s": window_s, "hop_s": hop_s, "sources": cls.sources(directory)}
+        if path.is_file():
+            catalog = cls.load(path)
+            if catalog.params == wanted:
+                return catalog
+
+        catalog = cls.build(directory, column, step, window_s, hop_s)
+        catalog.save(path)
+        print(f"Indexed {len(catalog.offsets)} windows of {len(catalog.traces)} traces -> {path}")
+        return catalog
+
+    def match(self, trace = None, **conditions):
+        """
+        Indices of windows whose stats fall in the given [low, high] ranges
+        (either bound may be None), e.g. match(delay_p95 = (60, None), bw_min = (None, 20)).
+        """
+        unknown = set(conditions) - set(STATS)
+        if unknown:
+            raise ValueError(f"Unknown stats {sorted(unknown)}, expected some of {STATS}")
+
+        if conditions:
+            stat, (low, high) = next(iter(conditions.items()))
+            values = self.sorted[stat]
+            lo = 0 if low is None else np.searchsorted(values, low, side = "left")
+            hi = len(values) if high is None else np.searchsorted(values, high, side = "right")
+            candidates = np.sort(self.order[stat][lo:hi])
+        else:
+            candidates = np.arange(len(self.offsets))
+
+        keep = np.ones(len(candidates), dtype = bool)
+        for stat, (low, high) in list(conditions.items())[1:]:
+            values = self.stats[stat][candidates]
+            if low is not None: keep &= values >= low
+            if high is not None: keep &= values <= high
+        if trace is not None:
+            trace = os.path.realpath(trace)
+            ids = [i for i, path in enumerate(self.traces) if os.path.realpath(path) == trace]
+            keep &= np.isin(self.trace_ids[candidates], ids)
+        return candidates[keep]
+
+    def query(self, trace = None, **conditions):
+        """[(trace path, offset row)] of matching windows, in trace/offset order."""
+        return [(self.traces[self.trace_ids[i]], int(self.offsets[i])) for i in self.match(trace, **conditions)]
+
+    def describe(self, i):
+        return ", ".join(f"{stat}={self.stats[stat][i]:.2f}" for stat in STATS)
+
+def parse_range(text):
+    low, _, high = text.partition(":")
+    return (float(low) if low else None, float(high) if high else None)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Index trace segments and query replay offsets.")
+    parser.add_argument("directory")
+    parser.add_argument("--column", type = int, default = 3, help = "delay column of the link (bandwidth is column - 2)")
+    parser.add_argument("--step", type = float, default = 0.1)
+    parser.add_argument("--window", type = float, default = 15.0)
+    parser.add_argument("--hop", type = float, default = 1.0)
+    for stat in STATS:
+        parser.add_argument(f"--{stat.replace('_', '-')}", metavar = "LOW:HIGH", type = parse_range)
+    parser.add_argument("--limit", type = int, default = 20)
+    args = parser.parse_args()
+
+    catalog = TraceCatalog.load_or_build(args.directory, args.column, args.step, args.window, args.hop)
+    conditions = {stat: getattr(args, stat) for stat in STATS if getattr(args, stat) is not None}
+    matches = catalog.match(**conditions)
+    print(f"{len(matches)} matching windows")
+    for i in matches[:args.limit]:
+        print(f"{catalog.traces[catalog.trace_ids[i]]} offset={catalog.offsets[i]}: {catalog.describe(i)}")
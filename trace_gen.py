@@ -0,0 +1,98 @@
+from pathlib import Path
+import argparse
+import time
+
+import numpy as np
+
+from handover import HANDOVER_PERIOD_S
+from link_trace import save_compiled
+
+# Synthetic Starlink-like link traces in the victoria.csv column layout:
+#
+#   0: uplink bandwidth (Mbit/s)     2: uplink delay (ms)
+#   1: downlink bandwidth (Mbit/s)   3: downlink delay (ms)
+#
+# (add_trace_link reads bandwidth from column - 2 of the
+# delay column, so r4-eth0 uses 0/2 and r2-eth1 uses 1/3.)
+#
+# Every HANDOVER_PERIOD_S epoch draws a new level per column; each row adds
+# jitter around that level. Row 0 is a reconfiguration instant, which is
+# where run_tests starts replay.
+#
+# Distributions are (numpy.random.Generator method, kwargs) pairs.
+
+DEFAULT_LEVELS = {
+    0: ("uniform", {"low": 5.0, "high": 25.0}),
+    1: ("uniform", {"low": 50.0, "high": 250.0}),
+    2: ("uniform", {"low": 15.0, "high": 35.0}),
+    3: ("uniform", {"low": 15.0, "high": 35.0}),
+}
+
+DEFAULT_JITTER = {
+    0: ("normal", {"loc": 0.0, "scale": 1.0}),
+    1: ("normal", {"loc": 0.0, "scale": 10.0}),
+    2: ("normal", {"loc": 0.0, "scale": 1.5}),
+    3: ("normal", {"loc": 0.0, "scale": 1.5}),
+}
+
+# Floors so jitter never produces a rate tbf rejects or a negative delay
+MINIMUM = {0: 0.5, 1: 0.5, 2: 0.0, 3: 0.0}
+
+def draw(rng, dist, size):
+    name, kwargs = dist
+    return getattr(rng, name)(size = size, **kwargs)
+
+def generate_trace(duration_s, step = 0.1, seed = None, levels = None, jitter = None,
+                   epoch_s = HANDOVER_PERIOD_S, phase_s = 0.0):
+    """
+    Return a trace[column][row] array covering duration_s at one row per step.
+    phase_s shifts the epoch grid: the first reconfiguration is phase_s after row 0.
+    """
+    levels = {**DEFAULT_LEVELS, **(levels or {})}
+    jitter = {**DEFAULT_JITTER, **(jitter or {})}
+    rng = np.random.default_rng(seed)
+
+    n_rows = int(round(duration_s / step))
+    t = np.arange(n_rows) * step
+    epoch = np.floor((t - phase_s) / epoch_s + 1e-9).astype(np.int64)
+    epoch -= epoch.min() if n_rows else 0
+    n_epochs = int(epoch.max()) + 1 if n_rows else 0
+
+    trace = np.empty((len(levels), n_rows), dtype = np.float64)
+    for column in range(len(levels)):
+        per_epoch = draw(rng, levels[column], n_epochs)
+        trace[column] = per_epoch[epoch] + draw(rng, jitter[column], n_rows)
+        np.maximum(trace[column], MINIMUM.get(column, 0.0), out = trace[column])
+
+    # Keep three decimals, like the measured traces
+    return np.round(trace, 3)
+
+def write_trace(path, trace, meta):
+    """Write trace in link_trace's compiled form; path should end in .trace.npy."""
+    path = Path(path)
+    save_compiled(trace, path, path.with_suffix(".json"), {**meta, "rows": int(trace.shape[1]), "columns": int(trace.shape[0])})
+
+def write_csv(path, trace):
+    np.savetxt(path, trace.T, delimiter = ",", fmt = "%.3f")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Generate a synthetic Starlink link trace.")
+    parser.add_argument("output", help = "compiled trace to write (e.g. synthetic.trace.npy)")
+    parser.add_argument("--hours", type = float, default = 1.0)
+    parser.add_argument("--step", type = float, default = 0.1, help = "seconds per row")
+    parser.add_argument("--seed", type = int, default = None)
+    parser.add_argument("--phase", type = float, default = 0.0, help = "seconds from row 0 to the first reconfiguration")
+    parser.add_argument("--csv", default = None, help = "also write the trace as CSV")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    trace = generate_trace(args.hours * 3600, args.step, args.seed, phase_s = args.phase)
+    elapsed = time.perf_counter() - start
+
+    write_trace(args.output, trace, {
+        "generator": "trace_gen.py", "seed": args.seed, "step": args.step, "phase": args.phase,
+        "levels": DEFAULT_LEVELS, "jitter": DEFAULT_JITTER,
+    })
+    if args.csv: write_csv(args.csv, trace)
+
+    print(f"Generated {trace.shape[1]} rows in {elapsed * 1e3:.1f}ms -> {args.output}")